@@ -1,13 +1,16 @@
 from django.contrib import admin
 
-from auction_api.models import AuctionLot, Bid, AuctionLotImage, Category
+from auction_api.models import AuctionLot, Bid, AuctionLotImage, Category, ProxyBid
 
 
 @admin.register(AuctionLot)
 class AuctionLotAdmin(admin.ModelAdmin):
     exclude = ("winner",)
+    # Closed by the closing tasks and buyouts, see MANAGED_FIELDS.
+    readonly_fields = ("is_active",)
 
 
 admin.site.register(Bid)
+admin.site.register(ProxyBid)
 admin.site.register(AuctionLotImage)
 admin.site.register(Category)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AuctionApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "auction_api"
+
+    def ready(self):
+        import auction_api.signals
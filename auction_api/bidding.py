@@ -0,0 +1,235 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from auction_api.events import publish_lot_event
+from auction_api.main_page import invalidate_main_page
+from auction_api.models import AuctionLot, Bid, ProxyBid
+from auction_api.notifications import notify_outbid, notify_winners
+from auction_api.tasks import publish_closed_events
+
+
+class BidConflictError(ValidationError):
+    """The lot received another bid after the caller had validated its own."""
+
+
+def place_bid(auction_lot_id, bidder, offered_price, expected_bid_count=None):
+    """
+    Validate and store a bid while holding a row lock on the auction lot,
+    so concurrent bids on the same lot are applied strictly one after another.
+    Pass `expected_bid_count` (the lot's bid_count the caller validated against)
+    to get BidConflictError instead of ValidationError when the bid was
+    made invalid by a concurrent one.
+
+    A bid at or above the buyout price buys the lot out, see `buy_out`.
+    The proxy bids of the lot answer the bid in the same transaction.
+    """
+    with transaction.atomic():
+        auction_lot = lock_auction_lot(auction_lot_id)
+        previous_leader_id = auction_lot.leading_bidder_id
+        bid = save_bid(auction_lot, bidder, offered_price, expected_bid_count)
+        resolve_proxy_bids(auction_lot)
+        notify_previous_leader(auction_lot, previous_leader_id)
+    return bid
+
+
+def buy_out(auction_lot_id, buyer):
+    """
+    Buy the lot at its buyout price: the purchase is stored as the winning
+    bid and the lot is closed in the same transaction.
+    """
+    with transaction.atomic():
+        auction_lot = lock_auction_lot(auction_lot_id)
+        previous_leader_id = auction_lot.leading_bidder_id
+        bid = save_bid(auction_lot, buyer, auction_lot.buyout_price)
+        notify_previous_leader(auction_lot, previous_leader_id)
+    return bid
+
+
+def lock_auction_lot(auction_lot_id):
+    try:
+        auction_lot = AuctionLot.objects.select_for_update().get(id=auction_lot_id)
+    except AuctionLot.DoesNotExist:
+        raise ValidationError("AuctionLot was not found.")
+
+    if not auction_lot.is_active or auction_lot.close_time <= now():
+        # Checked before anything is written, so bids racing a buyout
+        # are turned away as soon as they get the lock.
+        raise ValidationError("Cannot place a bid on a closed auction lot.")
+    return auction_lot
+
+
+def get_next_price(auction_lot):
+    """Return the lowest price the next bid on the lot may offer."""
+    return (
+        auction_lot.current_price or auction_lot.initial_price
+    ) + auction_lot.min_step
+
+
+def save_bid(auction_lot, bidder, offered_price, expected_bid_count=None):
+    """Store a bid on a lot locked by `lock_auction_lot` in the current transaction."""
+    bought_out = offered_price >= auction_lot.buyout_price
+    if bought_out:
+        offered_price = auction_lot.buyout_price
+
+    bid = Bid(auction_lot=auction_lot, bidder=bidder, offered_price=offered_price)
+    try:
+        bid.save()
+    except ValidationError as error:
+        if (
+            expected_bid_count is not None
+            and auction_lot.bid_count != expected_bid_count
+        ):
+            raise BidConflictError(error.messages) from error
+        raise
+
+    # The lot state is captured now: by commit time proxy bids may have
+    # moved it on, and every event must describe the lot after its own bid.
+    event = get_bid_event(bid)
+    transaction.on_commit(lambda: publish_lot_event(auction_lot.id, "bid", event))
+    if bought_out:
+        close_bought_out_lot(auction_lot, bidder)
+
+    return bid
+
+
+def notify_previous_leader(auction_lot, previous_leader_id):
+    """
+    Tell the leader from before a bid and the proxy bids answering it that
+    they were outbid. Bidders who led only in between aren't notified.
+    """
+    if previous_leader_id in (None, auction_lot.leading_bidder_id):
+        return
+    auction_lot_id = auction_lot.id
+    transaction.on_commit(lambda: notify_outbid(previous_leader_id, auction_lot_id))
+
+
+def close_bought_out_lot(auction_lot, buyer):
+    AuctionLot.objects.filter(id=auction_lot.id).update(is_active=False, winner=buyer)
+    auction_lot.is_active = False
+    auction_lot.winner = buyer
+
+    closed_lots = [(auction_lot.id, buyer.id)]
+    transaction.on_commit(lambda: publish_closed_events(closed_lots))
+    transaction.on_commit(lambda: notify_winners(closed_lots))
+    transaction.on_commit(invalidate_main_page)
+
+
+def set_proxy_bid(auction_lot_id, bidder, max_price):
+    """
+    Register or change the bidder's hidden maximum for the lot, and let
+    the proxy bids of the lot compete for it right away.
+    """
+    with transaction.atomic():
+        auction_lot = lock_auction_lot(auction_lot_id)
+        previous_leader_id = auction_lot.leading_bidder_id
+        if auction_lot.leading_bidder_id == bidder.id:
+            lowest_price = auction_lot.current_price
+        else:
+            lowest_price = get_next_price(auction_lot)
+        if max_price < lowest_price:
+            raise ValidationError(f"The maximum price must be at least {lowest_price}.")
+
+        # The lot lock serializes proxy bid changes, so no savepoint is needed
+        # to guard the insert, unlike with update_or_create().
+        proxy_bid = ProxyBid.objects.filter(
+            auction_lot=auction_lot, bidder=bidder
+        ).first() or ProxyBid(auction_lot=auction_lot, bidder=bidder)
+        proxy_bid.max_price = max_price
+        proxy_bid.is_active = True
+        # A changed maximum ranks as a new one on ties.
+        proxy_bid.created_at = now()
+        proxy_bid.save()
+        resolve_proxy_bids(auction_lot)
+        notify_previous_leader(auction_lot, previous_leader_id)
+        proxy_bid.refresh_from_db(fields=["is_active"])
+
+    return proxy_bid
+
+
+def resolve_proxy_bids(auction_lot):
+    """
+    Let the proxy bids of a lot locked by `lock_auction_lot` compete in one pass.
+    Only the two highest maximums matter: the runner-up bids its maximum
+    and the winner answers with one min_step more, capped at its own maximum,
+    so at most two visible bids are written. Equal maximums go to the
+    current leader, then to the earliest proxy bid.
+    """
+    if not auction_lot.is_active:
+        return
+
+    next_price = get_next_price(auction_lot)
+    proxy_bids = list(
+        ProxyBid.objects.filter(
+            auction_lot=auction_lot, is_active=True, max_price__gte=next_price
+        )
+        .select_related("bidder")
+        .order_by(
+            "-max_price",
+            Case(When(bidder_id=auction_lot.leading_bidder_id, then=0), default=1),
+            "created_at",
+            "id",
+        )[:2]
+    )
+
+    bids = []
+    if len(proxy_bids) == 1:
+        if proxy_bids[0].bidder_id != auction_lot.leading_bidder_id:
+            bids = [(proxy_bids[0], next_price)]
+    elif proxy_bids:
+        winner, runner_up = proxy_bids
+        price = runner_up.max_price + auction_lot.min_step
+        if runner_up.max_price >= auction_lot.buyout_price:
+            bids = [(winner, auction_lot.buyout_price)]
+        elif winner.max_price < price:
+            # Too close to the runner-up to outbid its maximum by a full step.
+            bids = [(winner, winner.max_price)]
+        else:
+            bids = [(runner_up, runner_up.max_price), (winner, price)]
+
+    for proxy_bid, price in bids:
+        save_bid(auction_lot, proxy_bid.bidder, price)
+
+    # Proxy bids that can't outbid the leader anymore are used up.
+    used_up = ProxyBid.objects.filter(auction_lot=auction_lot, is_active=True)
+    if auction_lot.is_active:
+        used_up = used_up.filter(max_price__lt=get_next_price(auction_lot)).exclude(
+            bidder_id=auction_lot.leading_bidder_id
+        )
+    used_up.update(is_active=False)
+
+
+def get_bid_event(bid):
+    auction_lot = bid.auction_lot
+    return {
+        "id": bid.id,
+        "offered_price": bid.offered_price,
+        "bidder_id": bid.bidder_id,
+        "bid_time": bid.bid_time,
+        "current_price": auction_lot.current_price,
+        "bid_count": auction_lot.bid_count,
+        "close_time": auction_lot.close_time,
+    }
+
+
+def count_bid_stats(bid_model=Bid):
+    """
+    Expressions recalculating the denormalized bid columns of a lot from its
+    bids, for updating lots. Migrations pass their historical Bid model.
+    """
+    lot_bids = bid_model.objects.filter(auction_lot=OuterRef("pk"))
+    highest_bid = lot_bids.order_by("-offered_price", "-bid_time")
+    bid_count = (
+        lot_bids.order_by()
+        .values("auction_lot")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    return {
+        "current_price": Subquery(highest_bid.values("offered_price")[:1]),
+        "leading_bidder": Subquery(highest_bid.values("bidder_id")[:1]),
+        "last_bid_at": Subquery(lot_bids.order_by("-bid_time").values("bid_time")[:1]),
+        "bid_count": Coalesce(Subquery(bid_count[:1]), Value(0)),
+    }
@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+from rest_framework import serializers
+
+from auction_api.images import MAX_UPLOAD_SIZE
+from auction_api.main_page import invalidate_main_page
+from auction_api.models import (
+    AuctionLot,
+    AuctionLotImage,
+    Category,
+    get_unique_image_name,
+)
+from auction_api.serializers import AuctionLotBaseSerializer
+from auction_api.tasks import delay_task, process_lot_image, schedule_lot_closing
+
+IMPORT_BATCH_SIZE = 500
+
+
+class AuctionLotImportSerializer(AuctionLotBaseSerializer):
+    category_id = serializers.IntegerField(required=False, allow_null=True)
+    images = serializers.ListField(
+        child=serializers.CharField(), required=False, default=list
+    )
+
+    def validate_category_id(self, value):
+        if value is not None and value not in self.context["category_ids"]:
+            raise serializers.ValidationError("Category was not found.")
+        return value
+
+    def validate_images(self, value):
+        missing = [name for name in value if name not in self.context["image_files"]]
+        if missing:
+            raise serializers.ValidationError(
+                f"Images were not uploaded: {', '.join(missing)}."
+            )
+        image_errors = self.context["image_errors"]
+        for name in value:
+            if name not in image_errors:
+                image_errors[name] = _check_image(self.context["image_files"][name])
+        errors = [
+            f"{name}: {image_errors[name]}" for name in value if image_errors[name]
+        ]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
+
+
+def read_manifest(manifest, filename):
+    """Yield manifest rows one by one from a binary CSV or JSON Lines file."""
+    text = io.TextIOWrapper(manifest, encoding="utf-8", newline="")
+    if filename.endswith(".csv"):
+        for row in csv.DictReader(text):
+            row = {key: value for key, value in row.items() if value != ""}
+            if "images" in row:
+                row["images"] = [name for name in row["images"].split(";") if name]
+            yield row
+    else:
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Reported by the row validation as a row without data.
+                yield None
+
+
+def _check_image(image_file):
+    """Return why an image file can't be imported, or None if it can."""
+    if isinstance(image_file, str):
+        size = os.path.getsize(image_file)
+    else:
+        size = image_file.size
+    if size > MAX_UPLOAD_SIZE:
+        return f"Image size must not exceed {MAX_UPLOAD_SIZE // (1024 * 1024)} MB."
+
+    try:
+        if isinstance(image_file, str):
+            with open(image_file, "rb") as file:
+                Image.open(file).verify()
+        else:
+            image_file.seek(0)
+            Image.open(image_file).verify()
+            image_file.seek(0)
+    except Exception:
+        # Pillow raises all kinds of errors for broken files, like ImageField.
+        return "Upload a valid image."
+    return None
+
+
+def _store_image(name, image_file):
+    storage_name = AuctionLotImage._meta.get_field("image").generate_filename(
+        None, get_unique_image_name(os.path.basename(name))
+    )
+    # Storage.save copies the file in chunks, so uploads are never fully buffered.
+    if isinstance(image_file, str):
+        with open(image_file, "rb") as file:
+            return default_storage.save(storage_name, File(file, name=name))
+    return default_storage.save(storage_name, image_file)
+
+
+def _create_batch(rows, owner, image_files):
+    lots = [AuctionLot(owner=owner, **row["data"]) for row in rows]
+    image_names = [
+        [_store_image(name, image_files[name]) for name in row["images"]]
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        AuctionLot.objects.bulk_create(lots)
+        images = AuctionLotImage.objects.bulk_create(
+            [
+                AuctionLotImage(lot=lot, image=name)
+                for lot, names in zip(lots, image_names)
+                for name in names
+            ]
+        )
+
+    for lot in lots:
+        schedule_lot_closing(lot.id, lot.close_time)
+    for image in images:
+        delay_task(process_lot_image, image.id)
+
+    return len(lots)
+
+
+def import_lots(rows, owner, image_files=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate manifest rows and create their lots in batches, each batch
+    in its own transaction. `image_files` maps the file names used in
+    the manifest to file objects or paths. Invalid rows are skipped and reported.
+    """
+    image_files = image_files or {}
+    context = {
+        "category_ids": set(Category.objects.values_list("id", flat=True)),
+        "image_files": image_files,
+        "image_errors": {},
+    }
+    report = {"created": 0, "errors": []}
+    rows = enumerate(rows, start=1)
+
+    while batch := list(islice(rows, batch_size)):
+        valid_rows = []
+        for row_number, row in batch:
+            serializer = AuctionLotImportSerializer(data=row, context=context)
+            if not serializer.is_valid():
+                report["errors"].append(
+                    {"row": row_number, "errors": serializer.errors}
+                )
+                continue
+            data = dict(serializer.validated_data)
+            valid_rows.append({"data": data, "images": data.pop("images")})
+
+        if valid_rows:
+            report["created"] += _create_batch(valid_rows, owner, image_files)
+
+    if report["created"]:
+        invalidate_main_page()
+
+    return report
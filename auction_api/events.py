@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "auction_lot:"
+SUBSCRIBER_QUEUE_SIZE = 100
+RECONNECT_DELAY = 1
+
+
+class EventBackend:
+    """
+    Base class for lot event backends. Keeps the subscribers of the current
+    process and fans every received message out to their queues.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    async def _start_listening(self):
+        pass
+
+    def _dispatch(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, {}).items())
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, message)
+
+    @staticmethod
+    def _put(queue, message):
+        if queue.full():
+            # Slow consumer: drop its oldest event rather than grow without bound.
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    async def subscribe(self, channel):
+        await self._start_listening()
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[channel][queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+
+class InMemoryEventBackend(EventBackend):
+    """Delivers events to subscribers of the same process only."""
+
+    def publish(self, channel, message):
+        self._dispatch(channel, message)
+
+
+class RedisEventBackend(EventBackend):
+    """
+    Publishes events over Redis pub/sub. Every process holds a single
+    pattern subscription and fans messages out to its local subscribers.
+    """
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+        self._listening = None
+
+    def publish(self, channel, message):
+        self._client.publish(channel, message)
+
+    async def _start_listening(self):
+        if self._listener is None or self._listener.done():
+            self._listening = asyncio.Event()
+            self._listener = asyncio.create_task(self._listen())
+        # Events published before Redis confirmed the subscription are lost.
+        await self._listening.wait()
+
+    async def _listen(self):
+        while True:
+            try:
+                client = aioredis.Redis.from_url(self.url)
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                    async for message in pubsub.listen():
+                        if message["type"] == "psubscribe":
+                            self._listening.set()
+                        elif message["type"] == "pmessage":
+                            self._dispatch(
+                                message["channel"].decode(), message["data"].decode()
+                            )
+            except redis.RedisError:
+                self._listening.clear()
+                logger.exception("Lost the Redis event subscription, reconnecting")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+
+@lru_cache(maxsize=None)
+def get_event_backend():
+    backend = getattr(settings, "AUCTION_EVENTS_BACKEND", None)
+    if backend:
+        return import_string(backend)()
+    if settings.REDIS_URL:
+        return RedisEventBackend(settings.REDIS_URL)
+    return InMemoryEventBackend()
+
+
+def publish_lot_event(auction_lot_id, event, data):
+    message = json.dumps({"event": event, "data": data}, cls=DjangoJSONEncoder)
+    try:
+        get_event_backend().publish(f"{CHANNEL_PREFIX}{auction_lot_id}", message)
+    except redis.RedisError:
+        logger.exception("Could not publish %s event of lot %s", event, auction_lot_id)
+
+
+async def subscribe_lot_events(auction_lot_id, timeout=None):
+    """
+    Yield the events of an auction lot as they are published,
+    or None when nothing was published for `timeout` seconds.
+    The first None is yielded as soon as the subscription is active,
+    state read after it can't miss an event.
+    """
+    backend = get_event_backend()
+    channel = f"{CHANNEL_PREFIX}{auction_lot_id}"
+    queue = await backend.subscribe(channel)
+    try:
+        yield None
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield None
+    finally:
+        backend.unsubscribe(channel, queue)
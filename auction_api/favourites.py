@@ -0,0 +1,98 @@
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from auction_api.models import AuctionLot
+
+Favourite = AuctionLot.favourites.through
+
+FAVOURITE_IDS_TIMEOUT = 60 * 60
+
+
+def _get_version_key(user_id):
+    return f"favourites:user:{user_id}:version"
+
+
+def _get_cache_key(user_id):
+    """
+    Return the key of the user's favourite ids under the current version.
+    Every toggle moves to a new version, so a set read from the database
+    before the toggle committed can only be cached under an abandoned key.
+    """
+    version_key = _get_version_key(user_id)
+    version = cache.get(version_key)
+    if version is None:
+        # Start from the clock, so an evicted version never goes back
+        # to the key of a stale set.
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key)
+    return f"favourites:user:{user_id}:{version}"
+
+
+def _bump_version(user_id):
+    try:
+        cache.incr(_get_version_key(user_id))
+    except ValueError:
+        cache.set(_get_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def get_favourite_ids(user_id):
+    """Return the set of lot ids favourited by the user, cached per user."""
+    cache_key = _get_cache_key(user_id)
+    lot_ids = cache.get(cache_key)
+    if lot_ids is None:
+        lot_ids = set(
+            Favourite.objects.filter(user_id=user_id).values_list(
+                "auctionlot_id", flat=True
+            )
+        )
+        cache.set(cache_key, lot_ids, FAVOURITE_IDS_TIMEOUT)
+    return lot_ids
+
+
+def toggle_favourite(user_id, auction_lot_id):
+    """
+    Add the lot to the user's favourites, or remove it if it is there already.
+    Returns whether the lot is favourited afterwards.
+    """
+    with transaction.atomic():
+        removed, _ = Favourite.objects.filter(
+            auctionlot_id=auction_lot_id, user_id=user_id
+        ).delete()
+        if removed:
+            change = -removed
+        else:
+            try:
+                with transaction.atomic():
+                    Favourite.objects.create(
+                        auctionlot_id=auction_lot_id, user_id=user_id
+                    )
+            except IntegrityError:
+                # Added by a concurrent request of the same user.
+                return True
+            change = 1
+
+        AuctionLot.objects.filter(id=auction_lot_id).update(
+            favourites_count=F("favourites_count") + change
+        )
+        transaction.on_commit(lambda: _bump_version(user_id))
+
+    return not removed
+
+
+def count_favourites(favourite_model=Favourite):
+    """
+    Expression counting the favourites of a lot, for updating favourites_count.
+    Migrations pass their historical favourites model.
+    """
+    favourite_count = (
+        favourite_model.objects.filter(auctionlot_id=OuterRef("pk"))
+        .order_by()
+        .values("auctionlot_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    return Coalesce(Subquery(favourite_count[:1]), Value(0))
@@ -0,0 +1,70 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_SIZE = (2048, 2048)
+THUMBNAIL_SIZE = (400, 400)
+WEBP_QUALITY = 80
+
+
+def _encode(image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def _open(field_file):
+    field_file.open("rb")
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+    # Apply the EXIF orientation before the metadata is dropped on re-encoding.
+    return ImageOps.exif_transpose(image), image.format or "JPEG"
+
+
+def _variant_name(field_file, suffix):
+    base = os.path.splitext(os.path.basename(field_file.name))[0]
+    return f"{base}-{suffix}.webp"
+
+
+def process_image(field_file, variant_fields):
+    """
+    Re-encode an uploaded image without its EXIF metadata, capped at
+    MAX_IMAGE_SIZE, and generate WebP variants. `variant_fields` maps the
+    name of a model field to the size of the variant stored in it
+    (None keeps the full size). Returns the values to update the row with.
+
+    Everything is encoded before anything is stored, and the re-encoded
+    image gets a new name: delete the original once the row points to it.
+    """
+    image, image_format = _open(field_file)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    image.thumbnail(MAX_IMAGE_SIZE)
+    if image_format == "JPEG" and image.mode == "RGBA":
+        image = image.convert("RGB")
+    image.info = {}
+
+    files = {field_file.field.name: (field_file.name, _encode(image, image_format))}
+    for field_name, size in variant_fields.items():
+        variant = image.copy()
+        if size:
+            variant.thumbnail(size)
+        model_field = field_file.instance._meta.get_field(field_name)
+        name = model_field.generate_filename(
+            field_file.instance, _variant_name(field_file, field_name)
+        )
+        files[field_name] = (name, _encode(variant, "WEBP", quality=WEBP_QUALITY))
+
+    storage = field_file.storage
+    values = {
+        field_name: storage.save(name, content)
+        for field_name, (name, content) in files.items()
+    }
+    values.update(width=image.width, height=image.height)
+    return values
@@ -0,0 +1,118 @@
+import random
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from auction_api.models import AuctionLot, Category
+from auction_api.serializers import AuctionLotListSerializer, CategorySerializer
+from auction_service.metrics import record_cache_lookup
+
+MAIN_PAGE_VERSION_KEY = "main_page:version"
+MAIN_PAGE_LATEST_KEY = "main_page:latest"
+MAIN_PAGE_LOCK_KEY = "main_page:rebuilding"
+MAIN_PAGE_TIMEOUT = 60 * 10
+MAIN_PAGE_LOCK_TIMEOUT = 60
+ALSO_LIKE_POOL_SIZE = 120
+ALSO_LIKE_SIZE = 12
+
+
+def _get_version():
+    version = cache.get(MAIN_PAGE_VERSION_KEY)
+    if version is None:
+        cache.add(MAIN_PAGE_VERSION_KEY, 1, timeout=None)
+        version = cache.get(MAIN_PAGE_VERSION_KEY, 1)
+    return version
+
+
+def _get_cache_key(version):
+    return f"main_page:v{version}"
+
+
+def build_main_page():
+    """
+    Compute the main page sections. The "also like" section is stored as a pool
+    of randomly picked lots, from which every request draws its own sample.
+    """
+    lots = AuctionLot.objects.prefetch_related("images")
+    # Random ids are drawn from the id range instead of loading every id,
+    # ids of deleted lots just leave the pool a bit smaller.
+    id_range = AuctionLot.objects.aggregate(low=Min("id"), high=Max("id"))
+    pool_ids = []
+    if id_range["low"] is not None:
+        ids = range(id_range["low"], id_range["high"] + 1)
+        pool_ids = random.sample(ids, min(len(ids), ALSO_LIKE_POOL_SIZE))
+
+    return {
+        "categories": CategorySerializer(Category.objects.all()[:4], many=True).data,
+        "top_lots": AuctionLotListSerializer(
+            lots.order_by("-bid_count")[:3], many=True
+        ).data,
+        "new": AuctionLotListSerializer(
+            lots.order_by("-created_at")[:4], many=True
+        ).data,
+        "also_like_pool": AuctionLotListSerializer(
+            lots.filter(id__in=pool_ids), many=True
+        ).data,
+    }
+
+
+def refresh_main_page(version=None):
+    """
+    Rebuild the payload. Without an explicit version the payload is published
+    under a new one, so clients holding the previous ETag get fresh data.
+    """
+    publish = version is None
+    if publish:
+        version = _get_version() + 1
+    payload = {**build_main_page(), "version": version}
+    cache.set(_get_cache_key(version), payload, MAIN_PAGE_TIMEOUT)
+    # Served while the next version is being rebuilt.
+    cache.set(MAIN_PAGE_LATEST_KEY, payload, timeout=None)
+    if publish:
+        cache.set(MAIN_PAGE_VERSION_KEY, version, timeout=None)
+    cache.delete(MAIN_PAGE_LOCK_KEY)
+    return payload
+
+
+def invalidate_main_page():
+    try:
+        cache.incr(MAIN_PAGE_VERSION_KEY)
+    except ValueError:
+        cache.set(MAIN_PAGE_VERSION_KEY, 1, timeout=None)
+
+
+def _get_payload(record=False):
+    version = _get_version()
+    payload = cache.get(_get_cache_key(version))
+    if record:
+        record_cache_lookup("main_page", payload is not None)
+    if payload is not None:
+        return payload
+
+    # One request queues the rebuild and everyone keeps getting the previous
+    # payload until it's done, so an invalidation doesn't cause a stampede.
+    latest = cache.get(MAIN_PAGE_LATEST_KEY)
+    if cache.add(MAIN_PAGE_LOCK_KEY, True, MAIN_PAGE_LOCK_TIMEOUT):
+        from auction_api.tasks import delay_task, refresh_main_page_cache
+
+        if latest is None or delay_task(refresh_main_page_cache, version) is None:
+            return refresh_main_page(version)
+    if latest is None:
+        # Nothing was ever built and another request holds the lock.
+        latest = {**build_main_page(), "version": version}
+    return latest
+
+
+def get_main_page_etag():
+    return f"main-page-{_get_payload()['version']}"
+
+
+def get_main_page():
+    payload = _get_payload(record=True)
+    pool = payload["also_like_pool"]
+    return {
+        "categories": payload["categories"],
+        "top_lots": payload["top_lots"],
+        "new": payload["new"],
+        "also_like": random.sample(pool, min(len(pool), ALSO_LIKE_SIZE)),
+    }
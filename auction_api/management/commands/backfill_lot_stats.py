@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auction_api.bidding import count_bid_stats
+from auction_api.favourites import count_favourites
+from auction_api.models import AuctionLot
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate the denormalized bid columns of auction lots "
+        "(current_price, bid_count, leading_bidder, last_bid_at) from the bids table "
+        "and favourites_count from the favourites. Migrations backfill them once, "
+        "this re-syncs them. "
+        "Use --batch_size to limit the number of lots updated per transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch_size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        lot_ids = list(AuctionLot.objects.order_by("id").values_list("id", flat=True))
+        self.stdout.write(f"Backfilling bid stats for {len(lot_ids)} lots...")
+
+        for start in range(0, len(lot_ids), batch_size):
+            batch = lot_ids[start : start + batch_size]
+            with transaction.atomic():
+                AuctionLot.objects.filter(id__in=batch).update(
+                    **count_bid_stats(), favourites_count=count_favourites()
+                )
+            self.stdout.write(f"Processed {start + len(batch)}/{len(lot_ids)} lots")
+
+        self.stdout.write(self.style.SUCCESS("Lot bid stats backfilled!"))
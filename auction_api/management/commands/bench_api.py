@@ -0,0 +1,195 @@
+import json
+import logging
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from auction_api.models import AuctionLot
+from auction_api.tasks import close_auction_lots
+
+BENCH_USER_EMAIL = "bench@example.com"
+
+
+def percentile(values, value):
+    return values[min(len(values) - 1, int(len(values) * value))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the browsing and bidding endpoints against the current database "
+        "(fill it with populate_db first) as a bench@example.com user. "
+        "Every request runs in a transaction that is rolled back, so the data "
+        "is left untouched. Use --baseline to compare with the results saved "
+        "by an earlier run with --save_baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--scenarios", nargs="+")
+        parser.add_argument("--baseline")
+        parser.add_argument("--save_baseline")
+        parser.add_argument(
+            "--disable_logging",
+            action="store_true",
+            help="Run with logging disabled, to measure its overhead.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed relative slowdown of p95 before it counts as a regression.",
+        )
+
+    def handle(self, *args, **options):
+        if options["disable_logging"]:
+            logging.disable(logging.CRITICAL)
+
+        lot = (
+            AuctionLot.objects.filter(is_active=True, close_time__gt=now())
+            .order_by("-bid_count")
+            .first()
+        )
+        if lot is None:
+            raise CommandError("No active lots to benchmark, run populate_db first.")
+
+        user, _ = get_user_model().objects.get_or_create(email=BENCH_USER_EMAIL)
+        client = Client(
+            SERVER_NAME="localhost",
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}",
+        )
+        scenarios = self.get_scenarios(client, lot)
+
+        names = options["scenarios"] or list(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for name in names:
+            results[name] = self.run_scenario(
+                scenarios[name], options["requests"], options["warmup"]
+            )
+            self.stdout.write(
+                "{}: {throughput:.1f} req/s, p50={p50:.2f}ms p95={p95:.2f}ms "
+                "p99={p99:.2f}ms, {queries:.1f} queries/request".format(
+                    name, **results[name]
+                )
+            )
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+            regressions = self.compare(results, baseline, options["tolerance"])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(regression))
+                raise CommandError(f"{len(regressions)} regressions found")
+            self.stdout.write(
+                self.style.SUCCESS("No regressions against the baseline!")
+            )
+
+    def get_scenarios(self, client, lot):
+        lot_url = reverse("auction-api:auction-lots-detail", args=[lot.id])
+        bids_url = reverse("auction-api:bid-list-create", args=[lot.id])
+        buyout_url = reverse("auction-api:auction-lots-buyout", args=[lot.id])
+        favourite_url = reverse(
+            "auction-api:auction-lots-toggle-favourite", args=[lot.id]
+        )
+        next_price = (lot.current_price or lot.initial_price) + lot.min_step
+
+        def check(response):
+            if response.status_code >= 400:
+                raise CommandError(
+                    f"{response.request['PATH_INFO']} returned "
+                    f"{response.status_code}: {response.content[:200]!r}"
+                )
+
+        return {
+            "main_page": lambda: check(client.get(reverse("main_page"))),
+            "lot_list": lambda: check(
+                client.get(reverse("auction-api:auction-lots-list"))
+            ),
+            "lot_detail": lambda: check(client.get(lot_url)),
+            "lot_search": lambda: check(
+                client.get(
+                    reverse("auction-api:auction-lots-search"),
+                    {"q": lot.item_name, "active": "true"},
+                )
+            ),
+            "bid_list": lambda: check(client.get(bids_url)),
+            "place_bid": lambda: check(
+                client.post(bids_url, {"offered_price": str(next_price)})
+            ),
+            "buyout": lambda: check(client.post(buyout_url)),
+            "toggle_favourite": lambda: check(client.post(favourite_url)),
+            "favourite_status": lambda: check(
+                client.get(
+                    reverse("auction-api:auction-lots-favourite-status"),
+                    {"ids": ",".join(str(lot.id + offset) for offset in range(20))},
+                )
+            ),
+            "close_auction_lots": close_auction_lots,
+        }
+
+    def run_scenario(self, scenario, requests, warmup):
+        for _ in range(warmup):
+            self.run_rolled_back(scenario)
+
+        latencies, queries = [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                latencies.append(self.run_rolled_back(scenario))
+            queries.append(len(captured))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "throughput": requests / elapsed,
+            "p50": percentile(latencies, 0.5) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "queries": statistics.mean(queries),
+        }
+
+    @staticmethod
+    def run_rolled_back(scenario):
+        with transaction.atomic():
+            started = time.perf_counter()
+            scenario()
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return elapsed
+
+    @staticmethod
+    def compare(results, baseline, tolerance):
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            expected = baseline[name]
+            if result["p95"] > expected["p95"] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: p95 {result['p95']:.2f}ms, "
+                    f"baseline {expected['p95']:.2f}ms"
+                )
+            if result["queries"] > expected["queries"]:
+                regressions.append(
+                    f"{name}: {result['queries']:.1f} queries/request, "
+                    f"baseline {expected['queries']:.1f}"
+                )
+        return regressions
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from auction_api.events import (
+    get_event_backend,
+    publish_lot_event,
+    subscribe_lot_events,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long lot events take to reach their subscribers. "
+        "Use --subscribers to set the number of concurrent listeners of one lot "
+        "and --events to set how many events are published."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=5000)
+        parser.add_argument("--events", type=int, default=20)
+        parser.add_argument("--lot_id", type=int, default=0)
+
+    def handle(self, *args, **options):
+        latencies = asyncio.run(self.run(**options))
+        latencies.sort()
+
+        def percentile(value):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * value))]
+
+        self.stdout.write(
+            f"Backend: {type(get_event_backend()).__name__}, "
+            f"deliveries: {len(latencies)}"
+        )
+        self.stdout.write(
+            "Latency ms: p50={:.2f} p95={:.2f} p99={:.2f} max={:.2f} mean={:.2f}".format(
+                percentile(0.5) * 1000,
+                percentile(0.95) * 1000,
+                percentile(0.99) * 1000,
+                latencies[-1] * 1000,
+                statistics.mean(latencies) * 1000,
+            )
+        )
+
+    async def run(self, subscribers, events, lot_id, **options):
+        latencies = []
+        ready = asyncio.Event()
+        subscribed = 0
+
+        async def listen():
+            nonlocal subscribed
+            stream = subscribe_lot_events(lot_id)
+            # The first None is yielded once the subscription is live.
+            await anext(stream)
+            subscribed += 1
+            if subscribed == subscribers:
+                ready.set()
+            received = 0
+            async for message in stream:
+                if message is None:
+                    continue
+                latencies.append(time.perf_counter() - json.loads(message)["data"])
+                received += 1
+                if received == events:
+                    break
+            await stream.aclose()
+
+        listeners = [asyncio.create_task(listen()) for _ in range(subscribers)]
+        await ready.wait()
+
+        for _ in range(events):
+            await asyncio.to_thread(
+                publish_lot_event, lot_id, "benchmark", time.perf_counter()
+            )
+            await asyncio.sleep(0.05)
+
+        await asyncio.gather(*listeners)
+        return latencies
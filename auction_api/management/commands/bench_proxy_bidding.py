@@ -0,0 +1,127 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from auction_api.bidding import get_next_price, place_bid, set_proxy_bid
+from auction_api.models import AuctionLot, ProxyBid
+
+User = get_user_model()
+
+EMAIL_PREFIX = "bench-proxy-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how fast proxy bids are resolved in a bidding war on one lot. "
+        "--proxies users register random maximums one after another, "
+        "then --bids explicit bids are placed against them. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--proxies", type=int, default=500)
+        parser.add_argument("--bids", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options["proxies"] < 2:
+            raise CommandError("At least 2 proxies are needed for a bidding war.")
+
+        rng = random.Random(options["seed"])
+        users = self.get_users(options["proxies"] + 2)
+        owner, bidder, proxy_users = users[0], users[1], users[2:]
+
+        with transaction.atomic():
+            lot = AuctionLot.objects.create(
+                item_name="Proxy bidding benchmark",
+                description="Created by bench_proxy_bidding",
+                location="Benchmark",
+                initial_price=Decimal(100),
+                min_step=Decimal(1),
+                buyout_price=Decimal(10**7),
+                close_time=now() + timedelta(days=1),
+                owner=owner,
+            )
+
+            def set_proxy_bids():
+                for user in proxy_users:
+                    lot.refresh_from_db(fields=["current_price"])
+                    max_price = get_next_price(lot) + rng.randint(0, 500)
+                    yield partial(set_proxy_bid, lot.id, user, max_price)
+
+            self.report("set_proxy_bid", set_proxy_bids())
+            lot.refresh_from_db()
+            self.stdout.write(
+                f"{lot.bids.count()} visible bids for {len(proxy_users)} proxies, "
+                f"price {lot.current_price}"
+            )
+            self.check_second_price(lot)
+
+            def place_bids():
+                for _ in range(options["bids"]):
+                    lot.refresh_from_db(fields=["current_price"])
+                    yield partial(place_bid, lot.id, bidder, get_next_price(lot))
+
+            self.report("place_bid", place_bids())
+            lot.refresh_from_db()
+            self.stdout.write(
+                f"{lot.bids.count()} visible bids in total, price {lot.current_price}"
+            )
+
+            transaction.set_rollback(True)
+
+    def get_users(self, count):
+        User.objects.bulk_create(
+            [
+                User(email=f"{EMAIL_PREFIX}{number}@example.com")
+                for number in range(count)
+            ],
+            ignore_conflicts=True,
+        )
+        return list(
+            User.objects.filter(email__startswith=EMAIL_PREFIX).order_by("id")[:count]
+        )
+
+    def report(self, name, calls):
+        latencies, queries = [], []
+        for call in calls:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                call()
+                latencies.append(time.perf_counter() - started)
+            queries.append(len(captured))
+
+        latencies.sort()
+        self.stdout.write(
+            "{}: {} calls, p50={:.2f}ms p95={:.2f}ms max={:.2f}ms, "
+            "{:.1f} queries/call".format(
+                name,
+                len(latencies),
+                latencies[len(latencies) // 2] * 1000,
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+                latencies[-1] * 1000,
+                statistics.mean(queries),
+            )
+        )
+
+    def check_second_price(self, lot):
+        """The highest maximum must lead, a min_step above the runner-up's."""
+        winner, runner_up = ProxyBid.objects.filter(auction_lot=lot).order_by(
+            "-max_price", "created_at", "id"
+        )[:2]
+        expected = min(winner.max_price, runner_up.max_price + lot.min_step)
+        if lot.leading_bidder_id != winner.bidder_id or lot.current_price != expected:
+            raise CommandError(
+                f"Expected {winner.bidder} to lead at {expected}, "
+                f"got {lot.leading_bidder} at {lot.current_price}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{winner.bidder} leads at {expected}"))
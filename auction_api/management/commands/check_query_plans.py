@@ -0,0 +1,79 @@
+import re
+import sys
+
+from django.contrib.postgres.search import SearchQuery
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from auction_api.models import AuctionLot, Bid
+from auction_api.search import SEARCH_CONFIG
+
+SEQUENTIAL_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (\w+)\b(?! USING)"),
+}
+
+
+def get_hot_queries():
+    lot_id = AuctionLot.objects.values_list("id", flat=True).first() or 0
+    queries = {
+        "close expired lots": AuctionLot.objects.filter(
+            is_active=True, close_time__lte=now()
+        ),
+        "newest lots": AuctionLot.objects.order_by("-created_at")[:4],
+        "top lots by bids": AuctionLot.objects.order_by("-bid_count")[:3],
+        "highest bid of a lot": Bid.objects.filter(auction_lot_id=lot_id).order_by(
+            "-offered_price"
+        )[:1],
+    }
+    if connection.vendor == "postgresql":
+        queries["full-text search"] = AuctionLot.objects.filter(
+            search_vector=SearchQuery("auction", config=SEARCH_CONFIG)
+        )
+    return queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the auction hot-path queries and fail "
+        "if any of them falls back to a sequential scan of a table."
+    )
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            self.stdout.write(
+                self.style.ERROR(f"Unsupported database vendor: {connection.vendor}")
+            )
+            sys.exit(1)
+
+        failed = []
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                # Small tables are always cheaper to scan, so only ask the planner
+                # whether an index *can* serve the query.
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for name, queryset in get_hot_queries().items():
+                plan = queryset.explain()
+                scanned_tables = pattern.findall(plan)
+                if scanned_tables:
+                    failed.append(name)
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f"{name}: sequential scan on {', '.join(scanned_tables)}"
+                        )
+                    )
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(f"{name}: OK")
+
+        if failed:
+            self.stdout.write(
+                self.style.ERROR(f"{len(failed)} hot queries regressed to a full scan")
+            )
+            sys.exit(1)
+
+        self.stdout.write(self.style.SUCCESS("All hot queries use indexes!"))
@@ -0,0 +1,54 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from auction_api.bulk_import import IMPORT_BATCH_SIZE, import_lots, read_manifest
+
+
+class Command(BaseCommand):
+    help = (
+        "Create auction lots from a CSV or JSON Lines manifest. "
+        "Use --images_dir to point at the images referenced by the manifest "
+        "and --batch_size to set the number of lots created per transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest")
+        parser.add_argument("--owner_email", required=True)
+        parser.add_argument("--images_dir")
+        parser.add_argument("--batch_size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            owner = get_user_model().objects.get(email=options["owner_email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['owner_email']} was not found.")
+
+        image_files = {}
+        images_dir = options["images_dir"]
+        if images_dir:
+            image_files = {
+                name: os.path.join(images_dir, name)
+                for name in os.listdir(images_dir)
+                if os.path.isfile(os.path.join(images_dir, name))
+            }
+
+        with open(options["manifest"], "rb") as manifest:
+            report = import_lots(
+                read_manifest(manifest, options["manifest"]),
+                owner=owner,
+                image_files=image_files,
+                batch_size=options["batch_size"],
+            )
+
+        for error in report["errors"]:
+            self.stdout.write(
+                self.style.ERROR(f"Row {error['row']}: {error['errors']}")
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report['created']} lots, "
+                f"skipped {len(report['errors'])} invalid rows."
+            )
+        )
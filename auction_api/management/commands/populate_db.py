@@ -0,0 +1,356 @@
+import multiprocessing
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils.timezone import now
+from PIL import Image
+
+from auction_api.favourites import count_favourites
+from auction_api.main_page import invalidate_main_page
+from auction_api.models import AuctionLot, AuctionLotImage, Bid, Category
+
+User = get_user_model()
+
+ADJECTIVES = [
+    "Vintage",
+    "Antique",
+    "Rare",
+    "Handmade",
+    "Signed",
+    "Limited",
+    "Restored",
+    "Classic",
+    "Modern",
+    "Collectible",
+]
+NOUNS = [
+    "watch",
+    "camera",
+    "guitar",
+    "painting",
+    "ring",
+    "vase",
+    "bicycle",
+    "lamp",
+    "record player",
+    "coin set",
+    "necklace",
+    "chess board",
+]
+LOCATIONS = ["Kyiv", "Lviv", "Odesa", "Kharkiv", "Dnipro", "Vinnytsia", "Poltava"]
+PLACEHOLDER_COLORS = ["#d9d9d9", "#c7d3e0", "#e0d6c7", "#cfe0c7", "#e0c7d9"]
+PLACEHOLDER_SIZE = (640, 480)
+PASSWORD = "populate_db"
+# Exponent of the Zipf-like bid distribution: the higher it is,
+# the more bids go to a few hot lots.
+BID_SKEW = 1.2
+LOT_AGE_DAYS = 30
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the generated values of `auto_now_add` fields."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def skewed_counts(total, size, rng):
+    """Split `total` into `size` counts following a shuffled Zipf-like curve."""
+    if not size:
+        return []
+    weights = [1 / rank**BID_SKEW for rank in range(1, size + 1)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for index in range(total - sum(counts)):
+        counts[index % size] += 1
+    rng.shuffle(counts)
+    return counts
+
+
+def create_bids(chunk):
+    """
+    Create the bid histories of a chunk of lots and update their bid columns.
+    Runs in a worker process, seeded per chunk so the result doesn't depend
+    on which worker picks the chunk up.
+    """
+    rng = random.Random(chunk["seed"])
+    user_ids = chunk["user_ids"]
+    current_time = now()
+    bids, lots = [], []
+    created = 0
+
+    def flush():
+        nonlocal created
+        with explicit_timestamps(Bid._meta.get_field("bid_time")):
+            Bid.objects.bulk_create(bids, batch_size=chunk["batch_size"])
+        created += len(bids)
+        bids.clear()
+
+    with transaction.atomic():
+        for lot_id, owner_id, price, step, created_at, close_time, count in chunk[
+            "lots"
+        ]:
+            if not count:
+                continue
+            end = min(close_time, current_time)
+            span = (end - created_at).total_seconds()
+            times = sorted(rng.random() * span for _ in range(count))
+            bidder_id = None
+            for offset in times:
+                previous_bidder_id = bidder_id
+                while bidder_id in (owner_id, previous_bidder_id):
+                    bidder_id = rng.choice(user_ids)
+                price += step * rng.choice((1, 1, 1, 2, 3, 5))
+                bids.append(
+                    Bid(
+                        auction_lot_id=lot_id,
+                        bidder_id=bidder_id,
+                        offered_price=price,
+                        bid_time=created_at + timedelta(seconds=offset),
+                    )
+                )
+            is_closed = close_time <= current_time
+            lots.append(
+                AuctionLot(
+                    id=lot_id,
+                    current_price=price,
+                    bid_count=count,
+                    leading_bidder_id=bidder_id,
+                    last_bid_at=bids[-1].bid_time,
+                    is_active=not is_closed,
+                    winner_id=bidder_id if is_closed else None,
+                )
+            )
+            if len(bids) >= chunk["batch_size"]:
+                flush()
+        flush()
+        AuctionLot.objects.bulk_update(
+            lots,
+            [
+                "current_price",
+                "bid_count",
+                "leading_bidder",
+                "last_bid_at",
+                "is_active",
+                "winner",
+            ],
+            batch_size=chunk["batch_size"],
+        )
+
+    connections.close_all()
+    return created
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, lots, images, favourites and "
+        "bid histories, where a few hot lots get most of the bids. "
+        "The same --seed generates the same data, and --workers sets "
+        "the number of processes creating bids."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--lots", type=int, default=10000)
+        parser.add_argument("--bids", type=int, default=100000)
+        parser.add_argument("--favourites", type=int, default=20000)
+        parser.add_argument("--images_per_lot", type=int, default=1)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch_size", type=int, default=5000)
+        parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+
+        if options["users"] < 3:
+            raise CommandError("At least 3 users are needed to generate bids.")
+
+        category_ids = self.get_category_ids()
+        user_ids = self.create_users(options["users"], options["seed"], batch_size)
+        counts = skewed_counts(options["bids"], options["lots"], rng)
+        lots = self.create_lots(counts, user_ids, category_ids, rng, batch_size)
+        self.create_images(lots, options["images_per_lot"], batch_size)
+        self.create_favourites(options["favourites"], lots, counts, user_ids, rng)
+        self.create_bids(lots, counts, user_ids, options, rng)
+
+        invalidate_main_page()
+        self.stdout.write(self.style.SUCCESS("Database populated!"))
+
+    def get_category_ids(self):
+        if not Category.objects.exists():
+            call_command("loaddata", settings.BASE_DIR / "categories.json")
+        return list(Category.objects.values_list("id", flat=True))
+
+    def create_users(self, count, seed, batch_size):
+        password = make_password(PASSWORD)
+        email_prefix = f"populate-{seed}-"
+        User.objects.bulk_create(
+            [
+                User(
+                    email=f"{email_prefix}{number}@example.com",
+                    first_name="User",
+                    last_name=str(number),
+                    password=password,
+                )
+                for number in range(count)
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        user_ids = list(
+            User.objects.filter(email__startswith=email_prefix)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        self.stdout.write(f"{len(user_ids)} users ready, password: {PASSWORD}")
+        return user_ids
+
+    def create_lots(self, bid_counts, user_ids, category_ids, rng, batch_size):
+        current_time = now()
+        lots = []
+        for bid_count in bid_counts:
+            created_at = current_time - timedelta(
+                seconds=rng.randint(0, LOT_AGE_DAYS * 24 * 60 * 60)
+            )
+            initial_price = Decimal(rng.randint(10, 5000))
+            min_step = max(Decimal(1), (initial_price / 50).quantize(Decimal(1)))
+            close_time = created_at + timedelta(days=rng.randint(1, 45))
+            lots.append(
+                AuctionLot(
+                    item_name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+                    description=" ".join(
+                        rng.choice(ADJECTIVES).lower() + " " + rng.choice(NOUNS)
+                        for _ in range(rng.randint(3, 12))
+                    ),
+                    location=rng.choice(LOCATIONS),
+                    category_id=rng.choice(category_ids) if category_ids else None,
+                    created_at=created_at,
+                    initial_price=initial_price,
+                    min_step=min_step,
+                    # Out of reach of the generated bids, which go up to 5 steps.
+                    buyout_price=initial_price + min_step * (5 * bid_count + 100),
+                    close_time=close_time,
+                    # Expired lots are closed like the close_auction_lots sweep
+                    # would, create_bids sets the winners of those with bids.
+                    is_active=close_time > current_time,
+                    owner_id=rng.choice(user_ids),
+                )
+            )
+
+        with explicit_timestamps(AuctionLot._meta.get_field("created_at")):
+            for start in range(0, len(lots), batch_size):
+                AuctionLot.objects.bulk_create(lots[start : start + batch_size])
+                self.stdout.write(
+                    f"Created {min(start + batch_size, len(lots))}/{len(lots)} lots"
+                )
+        return lots
+
+    def create_images(self, lots, images_per_lot, batch_size):
+        if not images_per_lot:
+            return
+        # Every lot points at one of a few shared placeholder files.
+        placeholders = []
+        for color in PLACEHOLDER_COLORS:
+            buffer = BytesIO()
+            Image.new("RGB", PLACEHOLDER_SIZE, color).save(buffer, format="JPEG")
+            placeholders.append(
+                default_storage.save(
+                    "lot_images/placeholder.jpg", ContentFile(buffer.getvalue())
+                )
+            )
+
+        AuctionLotImage.objects.bulk_create(
+            (
+                AuctionLotImage(
+                    lot=lot,
+                    image=placeholders[(lot.id + number) % len(placeholders)],
+                    width=PLACEHOLDER_SIZE[0],
+                    height=PLACEHOLDER_SIZE[1],
+                )
+                for lot in lots
+                for number in range(images_per_lot)
+            ),
+            batch_size=batch_size,
+        )
+        self.stdout.write(f"Created {len(lots) * images_per_lot} lot images")
+
+    def create_favourites(self, count, lots, bid_counts, user_ids, rng):
+        if not lots:
+            return
+        # Popular lots are favourited more, so follow the bid skew.
+        weights = [bid_count + 1 for bid_count in bid_counts]
+        Favourite = AuctionLot.favourites.through
+        Favourite.objects.bulk_create(
+            (
+                Favourite(auctionlot_id=lot.id, user_id=rng.choice(user_ids))
+                for lot in rng.choices(lots, weights, k=count)
+            ),
+            batch_size=5000,
+            ignore_conflicts=True,
+        )
+        AuctionLot.objects.filter(id__range=(lots[0].id, lots[-1].id)).update(
+            favourites_count=count_favourites()
+        )
+        self.stdout.write(f"Created up to {count} favourites")
+
+    def create_bids(self, lots, counts, user_ids, options, rng):
+        workers = options["workers"]
+        if connection.vendor == "sqlite" and workers > 1:
+            # SQLite allows a single writer at a time.
+            self.stdout.write("SQLite database, creating bids in a single process")
+            workers = 1
+
+        chunk_size = max(1, len(lots) // (workers * 4))
+        chunks = [
+            {
+                "seed": rng.getrandbits(64),
+                "user_ids": user_ids,
+                "batch_size": options["batch_size"],
+                "lots": [
+                    (
+                        lot.id,
+                        lot.owner_id,
+                        lot.initial_price,
+                        lot.min_step,
+                        lot.created_at,
+                        lot.close_time,
+                        count,
+                    )
+                    for lot, count in zip(
+                        lots[start : start + chunk_size],
+                        counts[start : start + chunk_size],
+                    )
+                ],
+            }
+            for start in range(0, len(lots), chunk_size)
+        ]
+
+        created = 0
+        if workers > 1:
+            # Forked workers must not share the connection of this process.
+            connections.close_all()
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                for chunk_bids in pool.imap_unordered(create_bids, chunks):
+                    created += chunk_bids
+                    self.stdout.write(f"Created {created}/{options['bids']} bids")
+        else:
+            for chunk in chunks:
+                created += create_bids(chunk)
+                self.stdout.write(f"Created {created}/{options['bids']} bids")
@@ -1,19 +1,35 @@
+import signal
+
 from django.core.management.base import BaseCommand
-from apscheduler.schedulers.background import BackgroundScheduler
-from auction_api.tasks import close_auction_lots
+from apscheduler.schedulers.blocking import BlockingScheduler
+from auction_api.tasks import (
+    close_auction_lots,
+    refresh_main_page_cache,
+    send_closing_soon_notifications,
+)
 
 
 class Command(BaseCommand):
-    help = "Run the APScheduler"
+    help = (
+        "Run the APScheduler. Lots are closed by per-lot Celery tasks, "
+        "the close_auction_lots sweep arms them shortly before they close "
+        "and catches the ones that were missed."
+    )
 
     def handle(self, *args, **kwargs):
-        scheduler = BackgroundScheduler()
-        scheduler.add_job(close_auction_lots, "interval", minutes=1)
-        scheduler.start()
-        self.stdout.write("Scheduler started. Running jobs...")
+        scheduler = BlockingScheduler()
+        # apply() runs the tasks in this process like a worker would,
+        # so their durations are recorded by the Celery task signals.
+        scheduler.add_job(close_auction_lots.apply, "interval", minutes=1)
+        scheduler.add_job(refresh_main_page_cache.apply, "interval", minutes=5)
+        scheduler.add_job(send_closing_soon_notifications.apply, "interval", minutes=1)
+
+        def shutdown(signum, frame):
+            self.stdout.write("Shutting down the scheduler...")
+            scheduler.shutdown(wait=False)
 
-        try:
-            while True:
-                pass  # Keeps the scheduler alive
-        except (KeyboardInterrupt, SystemExit):
-            scheduler.shutdown()
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        self.stdout.write("Scheduler started. Running jobs...")
+        scheduler.start()
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auctionlot",
+            name="bid_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="auctionlot",
+            name="current_price",
+            field=models.DecimalField(
+                decimal_places=2, default=None, editable=False, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="auctionlot",
+            name="last_bid_at",
+            field=models.DateTimeField(default=None, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="auctionlot",
+            name="leading_bidder",
+            field=models.ForeignKey(
+                default=None,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="leading_auction_lots",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
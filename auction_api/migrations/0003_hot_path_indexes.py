@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0002_auction_lot_bid_stats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="auctionlot",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["close_time"],
+                name="auction_lot_open_close_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auctionlot",
+            index=models.Index(
+                fields=["-created_at"], name="auction_lot_created_at_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auctionlot",
+            index=models.Index(fields=["-bid_count"], name="auction_lot_bid_count_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(
+                fields=["auction_lot", "-offered_price"], name="bid_lot_price_idx"
+            ),
+        ),
+    ]
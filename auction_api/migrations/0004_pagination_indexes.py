@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0003_hot_path_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="auctionlot",
+            name="auction_lot_created_at_idx",
+        ),
+        migrations.AddIndex(
+            model_name="auctionlot",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="auction_lot_created_at_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bid",
+            index=models.Index(
+                fields=["auction_lot", "-bid_time", "-id"], name="bid_lot_time_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0004_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auctionlot",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0005_auction_lot_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auctionlotimage",
+            name="height",
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="auctionlotimage",
+            name="thumbnail",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                null=True,
+                upload_to="lot_images/thumbnails/",
+            ),
+        ),
+        migrations.AddField(
+            model_name="auctionlotimage",
+            name="webp",
+            field=models.ImageField(
+                blank=True, editable=False, null=True, upload_to="lot_images/webp/"
+            ),
+        ),
+        migrations.AddField(
+            model_name="auctionlotimage",
+            name="width",
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="thumbnail",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                null=True,
+                upload_to="images/categories/thumbnails",
+            ),
+        ),
+    ]
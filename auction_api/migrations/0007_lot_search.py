@@ -0,0 +1,73 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER auction_lot_search_vector_update
+BEFORE INSERT OR UPDATE OF item_name, description, location
+ON auction_api_auctionlot FOR EACH ROW EXECUTE FUNCTION
+tsvector_update_trigger(search_vector, 'pg_catalog.simple', item_name, description, location)
+"""
+
+BACKFILL_SEARCH_VECTOR = """
+UPDATE auction_api_auctionlot SET search_vector = to_tsvector(
+    'pg_catalog.simple',
+    coalesce(item_name, '') || ' ' || coalesce(description, '') || ' ' || coalesce(location, '')
+)
+"""
+
+
+def create_search_vector_trigger(apps, schema_editor):
+    # The trigger only touches the vector when the searched columns are written,
+    # so bid updates of the price columns don't pay for re-indexing.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(SEARCH_VECTOR_TRIGGER)
+    schema_editor.execute(BACKFILL_SEARCH_VECTOR)
+
+
+def drop_search_vector_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "DROP TRIGGER IF EXISTS auction_lot_search_vector_update "
+        "ON auction_api_auctionlot"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0006_image_variants"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="auctionlot",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auctionlot",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="auction_lot_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auctionlot",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["item_name"],
+                name="auction_lot_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.RunPython(create_search_vector_trigger, drop_search_vector_trigger),
+    ]
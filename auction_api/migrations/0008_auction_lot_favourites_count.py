@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0007_lot_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auctionlot",
+            name="favourites_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
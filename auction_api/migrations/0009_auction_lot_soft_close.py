@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0008_auction_lot_favourites_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auctionlot",
+            name="soft_close_extension",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="auctionlot",
+            name="soft_close_window",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
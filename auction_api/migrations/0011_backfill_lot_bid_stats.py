@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def backfill_bid_stats(apps, schema_editor):
+    # Lots created before 0002 would otherwise accept bids below their
+    # highest one until backfill_lot_stats is run.
+    from auction_api.bidding import count_bid_stats
+
+    AuctionLot = apps.get_model("auction_api", "AuctionLot")
+    Bid = apps.get_model("auction_api", "Bid")
+    AuctionLot.objects.update(**count_bid_stats(Bid))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0010_proxy_bid"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_bid_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def backfill_favourites_count(apps, schema_editor):
+    # Removing a favourite added before 0008 would otherwise take the
+    # count below zero.
+    from auction_api.favourites import count_favourites
+
+    AuctionLot = apps.get_model("auction_api", "AuctionLot")
+    AuctionLot.objects.update(
+        favourites_count=count_favourites(AuctionLot.favourites.through)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auction_api", "0011_backfill_lot_bid_stats"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_favourites_count, migrations.RunPython.noop),
+    ]
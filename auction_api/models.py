@@ -1,6 +1,11 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.utils.timezone import now
 
 import uuid
@@ -23,6 +28,9 @@ class Category(models.Model):
     image = models.ImageField(
         upload_to="images/categories", null=True, blank=True, default=None
     )
+    thumbnail = models.ImageField(
+        upload_to="images/categories/thumbnails", null=True, blank=True, editable=False
+    )
 
     def save(self, *args, **kwargs):
         if self.image:
@@ -37,6 +45,19 @@ class Category(models.Model):
         return self.name
 
 
+# Columns of AuctionLot maintained by the bid engine and the closing tasks.
+MANAGED_FIELDS = {
+    "is_active",
+    "winner",
+    "favourites_count",
+    "current_price",
+    "bid_count",
+    "leading_bidder",
+    "last_bid_at",
+    "search_vector",
+}
+
+
 class AuctionLot(models.Model):
     id = models.BigAutoField(primary_key=True)
     item_name = models.CharField(max_length=100)
@@ -49,10 +70,15 @@ class AuctionLot(models.Model):
         null=True,
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     initial_price = models.DecimalField(max_digits=10, decimal_places=2)
     min_step = models.DecimalField(max_digits=10, decimal_places=2)
     buyout_price = models.DecimalField(max_digits=10, decimal_places=2)
     close_time = models.DateTimeField()
+    # Bids in the last `soft_close_window` seconds keep the lot open
+    # for at least `soft_close_extension` more seconds. 0 disables it.
+    soft_close_window = models.PositiveIntegerField(default=0)
+    soft_close_extension = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     owner = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="auction_lots"
@@ -65,6 +91,41 @@ class AuctionLot(models.Model):
         default=None,
     )
     favourites = models.ManyToManyField(User, related_name="favourite_lots", blank=True)
+    favourites_count = models.PositiveIntegerField(default=0, editable=False)
+    current_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, default=None, editable=False
+    )
+    bid_count = models.PositiveIntegerField(default=0, editable=False)
+    leading_bidder = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="leading_auction_lots",
+        null=True,
+        default=None,
+        editable=False,
+    )
+    last_bid_at = models.DateTimeField(null=True, default=None, editable=False)
+    # Maintained by a database trigger on Postgres, see migration 0007.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="auction_lot_search_idx"),
+            GinIndex(
+                fields=["item_name"],
+                opclasses=["gin_trgm_ops"],
+                name="auction_lot_name_trgm_idx",
+            ),
+            models.Index(
+                fields=["close_time"],
+                condition=Q(is_active=True),
+                name="auction_lot_open_close_idx",
+            ),
+            models.Index(
+                fields=["-created_at", "-id"], name="auction_lot_created_at_idx"
+            ),
+            models.Index(fields=["-bid_count"], name="auction_lot_bid_count_idx"),
+        ]
 
     def clean(self, *args, **kwargs):
         if self.buyout_price <= self.initial_price:
@@ -73,10 +134,35 @@ class AuctionLot(models.Model):
             raise ValidationError("Minimum step must be greater than zero.")
         if self.close_time <= now():
             raise ValidationError("Close time must be in the future.")
+        if bool(self.soft_close_window) != bool(self.soft_close_extension):
+            raise ValidationError(
+                "Soft close window and extension must be set together."
+            )
         super().clean(*args, **kwargs)
 
+    def get_extended_close_time(self, bid_time):
+        """
+        Return the close time after a bid at `bid_time`. A bid in the soft close
+        window moves it to `soft_close_extension` seconds after the bid,
+        so a storm of late bids keeps the lot open without stacking extensions.
+        """
+        window = timedelta(seconds=self.soft_close_window)
+        if not self.soft_close_window or self.close_time - bid_time > window:
+            return self.close_time
+        return max(
+            self.close_time, bid_time + timedelta(seconds=self.soft_close_extension)
+        )
+
     def save(self, *args, **kwargs):
         self.clean()
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # The bid engine and the closing tasks update these columns
+            # directly, a copy of the lot loaded earlier must not overwrite them.
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in MANAGED_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -86,6 +172,14 @@ class AuctionLot(models.Model):
 class AuctionLotImage(models.Model):
     lot = models.ForeignKey(AuctionLot, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="lot_images/", null=True, blank=True)
+    thumbnail = models.ImageField(
+        upload_to="lot_images/thumbnails/", null=True, blank=True, editable=False
+    )
+    webp = models.ImageField(
+        upload_to="lot_images/webp/", null=True, blank=True, editable=False
+    )
+    width = models.PositiveIntegerField(null=True, editable=False)
+    height = models.PositiveIntegerField(null=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
@@ -107,25 +201,43 @@ class Bid(models.Model):
     bidder = models.ForeignKey(User, on_delete=models.CASCADE)
     bid_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["auction_lot", "-offered_price"],
+                name="bid_lot_price_idx",
+            ),
+            models.Index(
+                fields=["auction_lot", "-bid_time", "-id"],
+                name="bid_lot_time_idx",
+            ),
+        ]
+
     def clean(self):
-        if self.auction_lot.close_time <= timezone.now():
+        if (
+            not self.auction_lot.is_active
+            or self.auction_lot.close_time <= timezone.now()
+        ):
             raise ValidationError("Cannot place a bid on a closed auction lot.")
 
         if self.offered_price <= self.auction_lot.initial_price:
             raise ValidationError("The bid must be higher than the initial price.")
 
-        max_bid = (
-            self.auction_lot.bids.exclude(id=self.id).order_by("-offered_price").first()
-        )
+        if not self._state.adding:
+            return
+
+        max_bid = self.auction_lot.current_price
 
-        if max_bid and self.offered_price <= max_bid.offered_price:
+        if max_bid is not None and self.offered_price <= max_bid:
             raise ValidationError(
                 "The bid must be higher than the current highest bid."
             )
 
         if (
-            max_bid
-            and (self.offered_price - max_bid.offered_price) < self.auction_lot.min_step
+            max_bid is not None
+            and (self.offered_price - max_bid) < self.auction_lot.min_step
+            # Buying the lot out is allowed whatever the step.
+            and self.offered_price < self.auction_lot.buyout_price
         ):
             raise ValidationError(
                 "The difference between the new bid "
@@ -135,7 +247,62 @@ class Bid(models.Model):
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        lot = self.auction_lot
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            # The soft close extension goes into the same update, so it is
+            # atomic with the bid. close_auction_lot re-arms itself for
+            # the moved close time, no rescheduling is needed here.
+            close_time = lot.get_extended_close_time(self.bid_time)
+            AuctionLot.objects.filter(pk=self.auction_lot_id).update(
+                current_price=self.offered_price,
+                bid_count=F("bid_count") + 1,
+                leading_bidder=self.bidder,
+                last_bid_at=self.bid_time,
+                close_time=close_time,
+            )
+
+        lot.current_price = self.offered_price
+        lot.bid_count += 1
+        lot.leading_bidder = self.bidder
+        lot.last_bid_at = self.bid_time
+        lot.close_time = close_time
 
     def __str__(self):
         return f"{self.bidder} - {self.offered_price}"
+
+
+class ProxyBid(models.Model):
+    """
+    A hidden maximum a user is willing to pay for a lot. The bid engine
+    bids on the user's behalf up to `max_price`, but only as high as
+    needed to lead: a min_step above the next highest maximum.
+    """
+
+    auction_lot = models.ForeignKey(
+        AuctionLot, related_name="proxy_bids", on_delete=models.CASCADE
+    )
+    bidder = models.ForeignKey(User, on_delete=models.CASCADE)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["auction_lot", "bidder"], name="proxy_bid_lot_bidder_unique"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["auction_lot", "-max_price", "created_at", "id"],
+                condition=Q(is_active=True),
+                name="proxy_bid_active_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.bidder} - up to {self.max_price}"
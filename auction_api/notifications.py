@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.utils.timezone import now
+
+from auction_api.models import AuctionLot
+
+logger = logging.getLogger(__name__)
+
+OUTBID = "outbid"
+CLOSING_SOON = "closing_soon"
+WON = "won"
+
+SUBJECTS = {
+    OUTBID: "You have been outbid on {lot.item_name}",
+    CLOSING_SOON: "{lot.item_name} closes soon",
+    WON: "You won {lot.item_name}",
+}
+# At most one outbid notification per user and lot within this window.
+OUTBID_COALESCE_SECONDS = 60 * 5
+CLOSING_SOON_WINDOW = timedelta(hours=1)
+NOTIFICATION_BATCH_SIZE = 200
+
+
+def _queue(notifications):
+    from auction_api.tasks import delay_task, send_notifications
+
+    notifications = iter(notifications)
+    while batch := list(islice(notifications, NOTIFICATION_BATCH_SIZE)):
+        delay_task(send_notifications, batch)
+
+
+def notify_outbid(user_id, auction_lot_id):
+    if cache.add(
+        f"notifications:{OUTBID}:{user_id}:{auction_lot_id}",
+        True,
+        OUTBID_COALESCE_SECONDS,
+    ):
+        _queue([(OUTBID, user_id, auction_lot_id)])
+
+
+def notify_winners(lots):
+    """Notify the winners of closed lots, given as (lot id, winner id) pairs."""
+    _queue(
+        (WON, winner_id, lot_id) for lot_id, winner_id in lots if winner_id is not None
+    )
+
+
+def notify_closing_soon():
+    """
+    Notify the users watching (having favourited) active lots that close
+    within CLOSING_SOON_WINDOW. Every lot is announced once.
+    """
+    current_time = now()
+    lot_ids = [
+        lot_id
+        for lot_id in AuctionLot.objects.filter(
+            is_active=True,
+            close_time__gt=current_time,
+            close_time__lte=current_time + CLOSING_SOON_WINDOW,
+        ).values_list("id", flat=True)
+        if cache.add(
+            f"notifications:{CLOSING_SOON}:{lot_id}",
+            True,
+            CLOSING_SOON_WINDOW.total_seconds() * 2,
+        )
+    ]
+    watchers = AuctionLot.favourites.through.objects.filter(
+        auctionlot_id__in=lot_ids
+    ).values_list("auctionlot_id", "user_id")
+    _queue((CLOSING_SOON, user_id, lot_id) for lot_id, user_id in watchers.iterator())
+    return len(lot_ids)
+
+
+def _build_messages(notifications):
+    users = get_user_model().objects.in_bulk(
+        {user_id for _, user_id, _ in notifications}
+    )
+    lots = AuctionLot.objects.in_bulk({lot_id for _, _, lot_id in notifications})
+
+    emails, telegram_messages = [], []
+    for kind, user_id, lot_id in notifications:
+        user, lot = users.get(user_id), lots.get(lot_id)
+        if user is None or lot is None or not user.is_active:
+            continue
+        context = {"user": user, "lot": lot}
+        subject = SUBJECTS[kind].format(**context)
+        body = render_to_string(f"emails/{kind}.txt", context)
+        emails.append(
+            EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [user.email])
+        )
+        if user.telegram_chat_id:
+            telegram_messages.append((user.telegram_chat_id, f"{subject}\n\n{body}"))
+    return emails, telegram_messages
+
+
+async def _send_telegram_messages(messages):
+    from telegram import Bot
+    from telegram.error import TelegramError
+
+    async with Bot(settings.TELEGRAM_BOT_TOKEN) as bot:
+        for chat_id, text in messages:
+            try:
+                await bot.send_message(chat_id=chat_id, text=text)
+            except TelegramError:
+                logger.exception("Could not send a Telegram message to %s", chat_id)
+
+
+def deliver_notifications(notifications):
+    """
+    Deliver (kind, user id, lot id) notifications: all emails over a single
+    SMTP connection, and Telegram messages to users who linked a chat.
+    """
+    emails, telegram_messages = _build_messages(notifications)
+
+    if emails:
+        with get_connection() as connection:
+            connection.send_messages(emails)
+    if telegram_messages and settings.TELEGRAM_BOT_TOKEN:
+        asyncio.run(_send_telegram_messages(telegram_messages))
+
+    logger.info(
+        "Sent notifications",
+        extra={"emails": len(emails), "telegram_messages": len(telegram_messages)},
+    )
@@ -0,0 +1,128 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    LimitOffsetPagination,
+)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination on a (timestamp, id) key. DRF's cursor only stores the
+    first ordering field and skips ties on it with an offset, this one stores
+    both fields and continues after them, so every page is a range scan of
+    the ordering index. Both fields must be ordered in the same direction.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        # Positions are unique, so the offset of DRF cursors is never needed.
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            _, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            is_reversed = self.ordering[0].startswith("-")
+            lookup = "lt" if reverse != is_reversed else "gt"
+            queryset = queryset.filter(
+                self._get_keyset_filter(queryset, current_position, lookup)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = current_position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(0, False, self._get_edge(-1)))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(0, True, self._get_edge(0)))
+
+    def _get_edge(self, index):
+        # Links continue after the first or the last item of the page.
+        if not self.page:
+            return self.cursor.position
+        return self._get_position_from_instance(self.page[index], self.ordering)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [getattr(instance, field.lstrip("-")) for field in ordering[:2]]
+        return json.dumps([values[0].isoformat(), values[1]])
+
+    def _get_keyset_filter(self, queryset, position, lookup):
+        time_field, id_field = (field.lstrip("-") for field in self.ordering[:2])
+        try:
+            time_value, id_value = json.loads(position)
+            time_value = queryset.model._meta.get_field(time_field).to_python(
+                time_value
+            )
+            id_value = queryset.model._meta.get_field(id_field).to_python(id_value)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if time_value is None or id_value is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        # The leading bound on the timestamp alone keeps the index range scan.
+        return Q(**{f"{time_field}__{lookup}e": time_value}) & (
+            Q(**{f"{time_field}__{lookup}": time_value})
+            | Q(**{f"{id_field}__{lookup}": id_value})
+        )
+
+
+def _reverse_ordering(ordering):
+    return tuple(
+        field[1:] if field.startswith("-") else f"-{field}" for field in ordering
+    )
+
+
+class AuctionLotCursorPagination(KeysetCursorPagination):
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class BidCursorPagination(KeysetCursorPagination):
+    ordering = ("-bid_time", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+class SearchPagination(LimitOffsetPagination):
+    # Search results are ranked, so they can not be paginated with a cursor.
+    default_limit = 20
+    max_limit = 100
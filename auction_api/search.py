@@ -0,0 +1,86 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from auction_api.models import AuctionLot, Category
+
+SEARCH_CONFIG = "simple"
+
+
+def _filter_lots(queryset, params):
+    queryset = queryset.alias(price=Coalesce("current_price", "initial_price"))
+    if params.get("min_price") is not None:
+        queryset = queryset.filter(price__gte=params["min_price"])
+    if params.get("max_price") is not None:
+        queryset = queryset.filter(price__lte=params["max_price"])
+    if params.get("active"):
+        queryset = queryset.filter(is_active=True, close_time__gt=now())
+    if params.get("closes_after"):
+        queryset = queryset.filter(close_time__gte=params["closes_after"])
+    if params.get("closes_before"):
+        queryset = queryset.filter(close_time__lte=params["closes_before"])
+    return queryset
+
+
+def _match_text(queryset, text):
+    """
+    Match lots against the search text and return them with the expression
+    to rank them by. On Postgres the search index is used, falling back to
+    trigram similarity of the item name when nothing matches (e.g. a typo).
+    """
+    category_ids = list(
+        Category.objects.filter(name__icontains=text).values_list("id", flat=True)
+    )
+    in_category = Q(category_id__in=category_ids)
+
+    if connection.vendor != "postgresql":
+        matches = queryset.filter(
+            Q(item_name__icontains=text)
+            | Q(description__icontains=text)
+            | Q(location__icontains=text)
+            | in_category
+        )
+        return matches, None
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+    matches = queryset.filter(Q(search_vector=query) | in_category)
+    if matches.exists():
+        return matches, SearchRank(F("search_vector"), query)
+
+    matches = queryset.filter(item_name__trigram_similar=text)
+    return matches, TrigramSimilarity("item_name", text)
+
+
+def search_lots(params):
+    """
+    Search auction lots by the validated `AuctionLotSearchQuerySerializer`
+    parameters. Returns the ranked lots and the category facets, which are
+    counted over all matching lots regardless of the category filter.
+    """
+    queryset = _filter_lots(AuctionLot.objects.all(), params)
+    rank = None
+    if params.get("q"):
+        queryset, rank = _match_text(queryset, params["q"])
+
+    facets = [
+        {"id": row["category_id"], "name": row["category__name"], "count": row["count"]}
+        for row in queryset.filter(category__isnull=False)
+        .values("category_id", "category__name")
+        .annotate(count=Count("id"))
+        .order_by("-count", "category__name")
+    ]
+
+    if params.get("category"):
+        queryset = queryset.filter(category_id__in=params["category"])
+    if rank is None:
+        queryset = queryset.order_by("-created_at", "-id")
+    else:
+        queryset = queryset.annotate(rank=rank).order_by("-rank", "-id")
+
+    return queryset.prefetch_related("images"), facets
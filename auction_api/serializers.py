@@ -1,8 +1,20 @@
-from django.db.models import Max
+import logging
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
 from django.utils import timezone
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
-from auction_api.models import AuctionLot, Bid, Category, AuctionLotImage
+from auction_api.favourites import get_favourite_ids
+from auction_api.images import MAX_UPLOAD_SIZE
+from auction_api.models import AuctionLot, Bid, Category, AuctionLotImage, ProxyBid
+from auction_api.tasks import delay_task, process_lot_image
+
+logger = logging.getLogger(__name__)
+
+DETAIL_BIDS = 20
 
 
 class AuctionImageSerializer(serializers.ModelSerializer):
@@ -10,6 +22,26 @@ class AuctionImageSerializer(serializers.ModelSerializer):
         model = AuctionLotImage
         fields = [
             "image",
+            "thumbnail",
+            "webp",
+            "width",
+            "height",
+        ]
+
+    def validate_image(self, value):
+        if value and value.size > MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"Image size must not exceed {MAX_UPLOAD_SIZE // (1024 * 1024)} MB."
+            )
+        return value
+
+
+class AuctionImageThumbnailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuctionLotImage
+        fields = [
+            "image",
+            "thumbnail",
         ]
 
 
@@ -27,6 +59,8 @@ class AuctionLotBaseSerializer(serializers.ModelSerializer):
             "min_step",
             "buyout_price",
             "close_time",
+            "soft_close_window",
+            "soft_close_extension",
             "images",
         ]
 
@@ -37,6 +71,7 @@ class AuctionLotBaseSerializer(serializers.ModelSerializer):
         self._validate_min_step(data, errors)
         self._validate_buyout_price(data, errors)
         self._validate_close_time(data, errors)
+        self._validate_soft_close(data, errors)
 
         if errors:
             raise serializers.ValidationError(errors)
@@ -63,10 +98,19 @@ class AuctionLotBaseSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def _validate_close_time(data, errors):
-        print(data["close_time"])
+        logger.debug("Validating lot close time %s", data["close_time"])
         if data["close_time"] <= timezone.now():
             errors["close_time"] = "Close time must be in the future."
 
+    @staticmethod
+    def _validate_soft_close(data, errors):
+        if bool(data.get("soft_close_window")) != bool(
+            data.get("soft_close_extension")
+        ):
+            errors["soft_close_window"] = (
+                "Soft close window and extension must be set together."
+            )
+
     def create(self, validated_data):
         images_data = validated_data.pop("images", [])
         lot = AuctionLot.objects.create(**validated_data)
@@ -78,34 +122,37 @@ class AuctionLotBaseSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         images_data = validated_data.pop("images", [])
-        lot = instance
-
-        instance.item_name = validated_data.get("item_name", instance.item_name)
-        instance.description = validated_data.get("description", instance.description)
-        instance.location = validated_data.get("location", instance.location)
-        instance.category_id = validated_data.get("category_id", instance.category_id)
-        instance.initial_price = validated_data.get(
-            "initial_price", instance.initial_price
-        )
-        instance.min_step = validated_data.get("min_step", instance.min_step)
-        instance.buyout_price = validated_data.get(
-            "buyout_price", instance.buyout_price
-        )
-        instance.close_time = validated_data.get("close_time", instance.close_time)
-        instance.is_active = validated_data.get("is_active", instance.is_active)
-        instance.save()
-
-        if images_data:
-            valid_images = []
-            for image_data in images_data:
-                serializer = AuctionImageSerializer(data=image_data)
-                if serializer.is_valid():
-                    valid_images.append(
-                        AuctionLotImage(lot=lot, **serializer.validated_data)
+
+        with transaction.atomic():
+            # Reload the lot under a lock and write only the edited fields,
+            # so the edit neither races nor undoes bids, closing or soft close.
+            lot = AuctionLot.objects.select_for_update().get(pk=instance.pk)
+            for field, value in validated_data.items():
+                setattr(lot, field, value)
+            if validated_data:
+                lot.save(
+                    update_fields=[
+                        lot._meta.get_field(field).name for field in validated_data
+                    ]
+                )
+
+            if images_data:
+                valid_images = []
+                for image_data in images_data:
+                    serializer = AuctionImageSerializer(data=image_data)
+                    if serializer.is_valid():
+                        valid_images.append(
+                            AuctionLotImage(lot=lot, **serializer.validated_data)
+                        )
+                    else:
+                        raise serializers.ValidationError(serializer.errors)
+                AuctionLotImage.objects.bulk_create(valid_images)
+                for lot_image in valid_images:
+                    transaction.on_commit(
+                        partial(delay_task, process_lot_image, lot_image.id)
                     )
-                else:
-                    raise serializers.ValidationError(serializer.errors)
-            AuctionLotImage.objects.bulk_create(valid_images)
+
+        return lot
 
 
 class AuctionLotSerializer(AuctionLotBaseSerializer):
@@ -123,12 +170,19 @@ class AuctionLotSerializer(AuctionLotBaseSerializer):
             "min_step",
             "buyout_price",
             "close_time",
+            "soft_close_window",
+            "soft_close_extension",
             "owner_id",
             "is_active",
             "winner_id",
+            "current_price",
+            "bid_count",
+            "last_bid_at",
+            "favourites_count",
             "favourites",
         ]
 
+        read_only_fields = ["is_active", "winner_id"]
         extra_kwargs = {"favourites": {"read_only": True}}
 
     def get_favourites(self, obj):
@@ -140,37 +194,34 @@ class AuctionLotSerializer(AuctionLotBaseSerializer):
         if not user.is_authenticated:
             return False
 
-        return obj.favourites.filter(id=user.id).exists()
+        if hasattr(obj, "is_favourited"):
+            return obj.is_favourited
+
+        return obj.id in get_favourite_ids(user.id)
 
 
 class AuctionLotListSerializer(AuctionLotBaseSerializer):
+    images = AuctionImageThumbnailSerializer(many=True, read_only=True)
+
     class Meta:
         model = AuctionLot
-        fields = ["id", "item_name", "initial_price", "images"]
+        fields = ["id", "item_name", "initial_price", "current_price", "images"]
 
 
-class AuctionLotDetailSerializer(serializers.ModelSerializer):
-    bids = serializers.PrimaryKeyRelatedField(
-        many=True,
-        read_only=True,
-    )
+class AuctionLotDetailSerializer(AuctionLotSerializer):
+    bids = serializers.SerializerMethodField()
 
-    class Meta:
-        model = AuctionLot
-        fields = [
-            "id",
-            "item_name",
-            "description",
-            "location",
-            "category_id",
-            "initial_price",
-            "min_step",
-            "buyout_price",
-            "close_time",
-            "owner_id",
-            "bids",
-            "winner_id",
-        ]
+    class Meta(AuctionLotSerializer.Meta):
+        fields = [*AuctionLotSerializer.Meta.fields, "bids"]
+
+    @extend_schema_field(serializers.ListField(child=serializers.IntegerField()))
+    def get_bids(self, obj):
+        # Only the latest bids, the full history is paginated by the bids view.
+        return list(
+            obj.bids.order_by("-bid_time", "-id").values_list("id", flat=True)[
+                :DETAIL_BIDS
+            ]
+        )
 
 
 class BidSerializer(serializers.ModelSerializer):
@@ -179,6 +230,7 @@ class BidSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bid
         fields = ["id", "auction_lot", "offered_price", "bidder", "bid_time"]
+        read_only_fields = ["auction_lot"]
 
     def validate_offered_price(self, value):
         auction_lot = self._get_auction_lot()
@@ -187,25 +239,33 @@ class BidSerializer(serializers.ModelSerializer):
         self._validate_initial_price(value, auction_lot)
         self._validate_offered_price(value, auction_lot)
 
+        self._auction_lot = auction_lot
         return value
 
+    def validate(self, data):
+        data["auction_lot"] = self._auction_lot
+        return data
+
     def _get_auction_lot(self):
-        auction_lot_id = self.initial_data.get("auction_lot")
+        auction_lot_id = self.context.get("auction_lot_id") or self.initial_data.get(
+            "auction_lot"
+        )
         try:
-            return AuctionLot.objects.annotate(max_bid=Max("bids__offered_price")).get(
-                id=auction_lot_id
-            )
+            return AuctionLot.objects.get(id=auction_lot_id)
         except AuctionLot.DoesNotExist:
             raise serializers.ValidationError("AuctionLot was not found.")
 
     @staticmethod
     def _validate_close_time(auction_lot):
-        auction_lot.refresh_from_db()
         close_time = auction_lot.close_time
         current_time = timezone.now()
-        print(f"current_time: {current_time}")
-        print(f"close_time: {close_time}")
-        if close_time <= current_time:
+        logger.debug(
+            "Validating bid on lot %s: current time %s, close time %s",
+            auction_lot.id,
+            current_time,
+            close_time,
+        )
+        if not auction_lot.is_active or close_time <= current_time:
             raise serializers.ValidationError("The auction is already closed.")
 
     @staticmethod
@@ -217,14 +277,17 @@ class BidSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def _validate_offered_price(value, auction_lot):
-        max_bid = auction_lot.max_bid or auction_lot.initial_price
+        max_bid = auction_lot.current_price or auction_lot.initial_price
 
         if max_bid:
             if value <= max_bid:
                 raise serializers.ValidationError(
                     f"The bid must be higher than the current highest bid ({max_bid})."
                 )
-            if value - max_bid < auction_lot.min_step:
+            if (
+                value - max_bid < auction_lot.min_step
+                and value < auction_lot.buyout_price
+            ):
                 raise serializers.ValidationError(
                     f"The difference between the new bid"
                     f" and the current highest bid must be "
@@ -232,7 +295,53 @@ class BidSerializer(serializers.ModelSerializer):
                 )
 
 
+class ProxyBidSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProxyBid
+        fields = ["id", "auction_lot", "max_price", "created_at", "is_active"]
+        read_only_fields = ["auction_lot", "created_at", "is_active"]
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ["id", "name", "image"]
+        fields = ["id", "name", "image", "thumbnail"]
+
+
+class AuctionLotSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    category = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False
+    )
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal(0), required=False
+    )
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal(0), required=False
+    )
+    active = serializers.BooleanField(required=False, default=False)
+    closes_after = serializers.DateTimeField(required=False)
+    closes_before = serializers.DateTimeField(required=False)
+
+    def to_internal_value(self, data):
+        if hasattr(data, "getlist"):
+            # Categories may be repeated (?category=1&category=2) or comma-separated.
+            categories = [
+                value
+                for item in data.getlist("category")
+                for value in item.split(",")
+                if value
+            ]
+            data = data.dict()
+            data.pop("category", None)
+            if categories:
+                data["category"] = categories
+        return super().to_internal_value(data)
+
+    def validate(self, data):
+        min_price, max_price = data.get("min_price"), data.get("max_price")
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError(
+                "Minimum price cannot be greater than maximum price."
+            )
+        return data
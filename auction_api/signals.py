@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from auction_api.main_page import invalidate_main_page
+from auction_api.models import AuctionLot, AuctionLotImage, Category
+from auction_api.tasks import (
+    delay_task,
+    process_category_image,
+    process_lot_image,
+    schedule_lot_closing,
+)
+
+
+@receiver(post_save, sender=AuctionLot)
+def auction_lot_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(invalidate_main_page)
+
+    if instance.is_active:
+        transaction.on_commit(
+            lambda: schedule_lot_closing(instance.id, instance.close_time)
+        )
+
+
+@receiver(post_delete, sender=AuctionLot)
+def auction_lot_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_main_page)
+
+
+@receiver(post_save, sender=AuctionLotImage)
+def auction_lot_image_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        # Fixtures are loaded as they are, their files may not even exist.
+        return
+    if created and instance.image:
+        transaction.on_commit(lambda: delay_task(process_lot_image, instance.id))
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created and instance.image:
+        transaction.on_commit(lambda: delay_task(process_category_image, instance.id))
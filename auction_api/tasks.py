@@ -1,43 +1,236 @@
+import logging
+import time
+from datetime import timedelta
+
 from celery import shared_task
-from django.db.models import OuterRef, Subquery
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 from django.utils.timezone import now
+from kombu.exceptions import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Close tasks are only armed this long before the close time: Redis
+# redelivers unacknowledged eta tasks after the broker's visibility
+# timeout (1 hour by default), and workers hold them in memory until then.
+CLOSE_SCHEDULE_HORIZON = timedelta(minutes=30)
+ARMED_UNTIL_KEY = "close_auction_lots:armed_until"
+
+
+def delay_task(task, *args, **options):
+    """
+    Send a task to the broker without retrying, so an unreachable broker
+    does not hold up the request that triggered it.
+    """
+    try:
+        return task.apply_async(args=args, retry=False, **options)
+    except OperationalError:
+        logger.warning("Could not send task %s%s to the broker", task.name, args)
+
+
+def schedule_lot_closing(auction_lot_id, close_time):
+    """
+    Arm a close_auction_lot task for the lot's close time. Lots closing after
+    CLOSE_SCHEDULE_HORIZON are armed later by the close_auction_lots sweep,
+    as are all lots while the broker is unreachable.
+    """
+    if close_auction_lot.app.conf.task_always_eager:
+        # Eager tasks ignore eta and would run (and re-arm) immediately.
+        return
+    if close_time > now() + CLOSE_SCHEDULE_HORIZON:
+        return
+
+    delay_task(close_auction_lot, auction_lot_id, eta=close_time)
+
+
+def arm_lots_closing_soon(current_time):
+    """Arm the lots whose close time entered the horizon since the last sweep."""
+    from auction_api.models import AuctionLot
+
+    horizon = current_time + CLOSE_SCHEDULE_HORIZON
+    armed_until = cache.get(ARMED_UNTIL_KEY) or current_time
+    lots = AuctionLot.objects.filter(
+        is_active=True, close_time__gt=armed_until, close_time__lte=horizon
+    ).values_list("id", "close_time")
+    for lot_id, close_time in lots.iterator():
+        delay_task(close_auction_lot, lot_id, eta=close_time)
+    cache.set(ARMED_UNTIL_KEY, horizon, timeout=None)
+
+
+def publish_closed_events(lots):
+    from auction_api.events import publish_lot_event
+
+    for lot_id, winner_id in lots:
+        publish_lot_event(lot_id, "closed", {"winner_id": winner_id})
 
 
 @shared_task
-def close_auction_lots():
-    from auction_api.models import AuctionLot, Bid
+def close_auction_lot(auction_lot_id):
+    from auction_api.models import AuctionLot
 
-    print("Started closing auction lots...")
+    close_time = (
+        AuctionLot.objects.filter(id=auction_lot_id, is_active=True)
+        .values_list("close_time", flat=True)
+        .first()
+    )
+    if close_time is None:
+        return
 
-    max_bids = Bid.objects.filter(auction_lot=OuterRef("pk")).order_by("-offered_price")
+    if close_time > now():
+        # The close time was moved after this task had been scheduled.
+        schedule_lot_closing(auction_lot_id, close_time)
+        return
 
-    expired_lots = (
-        AuctionLot.objects.filter(is_active=True, close_time__lte=now())
-        .prefetch_related("bids")
-        .annotate(
-            max_bid=Subquery(max_bids.values("offered_price")[:1]),
-            found_winner=Subquery(max_bids.values("bidder_id")[:1]),
+    with transaction.atomic():
+        lot = (
+            AuctionLot.objects.select_for_update()
+            .filter(id=auction_lot_id, is_active=True)
+            .values_list("id", "leading_bidder_id", "close_time")
+            .first()
         )
-    )
+        if lot is None:
+            return
 
-    if not expired_lots:
-        print("No expired auction lots found.")
-    else:
-        print(f"Found {expired_lots.count()} expired lots to close.")
+        lot_id, winner_id, close_time = lot
+        if close_time > now():
+            # A bid extended the lot (soft close) while the lock was awaited.
+            transaction.on_commit(
+                lambda: schedule_lot_closing(auction_lot_id, close_time)
+            )
+            return
 
-    lots_to_close = []
-    for expired_lot in expired_lots:
-        print(
-            f"Closing lot {expired_lot.id}: " f"Winner id is {expired_lot.found_winner}"
+        AuctionLot.objects.filter(id=auction_lot_id).update(
+            is_active=False, winner=F("leading_bidder")
         )
-        expired_lot.is_active = False
-        expired_lot.winner_id = expired_lot.found_winner
-        lots_to_close.append(expired_lot)
 
-    AuctionLot.objects.bulk_update(expired_lots, ["is_active", "winner_id"])
+    closed_lots = [(lot_id, winner_id)]
+    publish_closed_events(closed_lots)
+
+    from auction_api.notifications import notify_winners
+
+    notify_winners(closed_lots)
+
+    from auction_api.main_page import invalidate_main_page
+
+    invalidate_main_page()
+
+
+@shared_task
+def close_auction_lots(batch_size=500):
+    """
+    Close expired lots in batches of `batch_size`, one transaction per batch.
+    Rows locked by another worker are skipped, so overlapping runs
+    never close the same lot twice.
+    """
+    from auction_api.models import AuctionLot
+    from auction_api.notifications import notify_winners
+
+    logger.debug("Started closing auction lots")
+
+    started_at = time.monotonic()
+    sweep_time = now()
+    stats = {"lots_closed": 0, "batches": 0, "max_lag_seconds": 0.0}
+
+    while True:
+        with transaction.atomic():
+            batch = list(
+                AuctionLot.objects.filter(is_active=True, close_time__lte=sweep_time)
+                .select_for_update(skip_locked=True)
+                .order_by("close_time")
+                .values_list("id", "close_time", "leading_bidder_id")[:batch_size]
+            )
+            if not batch:
+                break
+
+            AuctionLot.objects.filter(id__in=[lot[0] for lot in batch]).update(
+                is_active=False, winner=F("leading_bidder")
+            )
+
+        for lot_id, close_time, winner_id in batch:
+            logger.debug("Closed lot %s, winner id is %s", lot_id, winner_id)
+        closed_lots = [(lot_id, winner_id) for lot_id, _, winner_id in batch]
+        publish_closed_events(closed_lots)
+        notify_winners(closed_lots)
+
+        stats["lots_closed"] += len(batch)
+        stats["batches"] += 1
+        stats["max_lag_seconds"] = max(
+            stats["max_lag_seconds"], (sweep_time - batch[0][1]).total_seconds()
+        )
+
+    if stats["lots_closed"]:
+        from auction_api.main_page import invalidate_main_page
+
+        invalidate_main_page()
+    else:
+        logger.debug("No expired auction lots found")
+
+    arm_lots_closing_soon(sweep_time)
+
+    stats["duration_seconds"] = round(time.monotonic() - started_at, 3)
+    logger.info("Finished closing auction lots", extra=stats)
+    return stats
+
+
+@shared_task
+def process_lot_image(image_id):
+    from auction_api.images import THUMBNAIL_SIZE, process_image
+    from auction_api.main_page import refresh_main_page
+    from auction_api.models import AuctionLotImage
+
+    lot_image = AuctionLotImage.objects.filter(id=image_id).first()
+    if lot_image is None or not lot_image.image:
+        return
+
+    values = process_image(lot_image.image, {"thumbnail": THUMBNAIL_SIZE, "webp": None})
+    AuctionLotImage.objects.filter(id=image_id).update(**values)
+    # The cached main page is served while a new version is being rebuilt,
+    # so it's rebuilt here before its original image URL stops working.
+    refresh_main_page()
+    lot_image.image.delete(save=False)
+
+
+@shared_task
+def process_category_image(category_id):
+    from auction_api.images import THUMBNAIL_SIZE, process_image
+    from auction_api.main_page import refresh_main_page
+    from auction_api.models import Category
+
+    category = Category.objects.filter(id=category_id).first()
+    if category is None or not category.image:
+        return
+
+    values = process_image(category.image, {"thumbnail": THUMBNAIL_SIZE})
+    Category.objects.filter(id=category_id).update(
+        image=values["image"], thumbnail=values["thumbnail"]
+    )
+    refresh_main_page()
+    category.image.delete(save=False)
+
+
+@shared_task
+def refresh_main_page_cache(version=None):
+    from auction_api.main_page import refresh_main_page
+
+    refresh_main_page(version)
+
+
+@shared_task
+def send_notifications(notifications):
+    from auction_api.notifications import deliver_notifications
+
+    deliver_notifications([tuple(notification) for notification in notifications])
+
+
+@shared_task
+def send_closing_soon_notifications():
+    from auction_api.notifications import notify_closing_soon
+
+    return notify_closing_soon()
 
 
 @shared_task
 def test_task():
-    print("Task executed!")
+    logger.info("Task executed")
     return "Task completed!"
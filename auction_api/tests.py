@@ -1,3 +1,1280 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import logging
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core import mail, serializers
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils.timezone import now
+from PIL import Image
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from auction_api.bidding import (
+    BidConflictError,
+    buy_out,
+    place_bid,
+    set_proxy_bid,
+)
+from auction_api.bulk_import import import_lots
+from auction_api.events import RedisEventBackend, publish_lot_event
+from auction_api.favourites import (
+    _get_cache_key,
+    get_favourite_ids,
+    toggle_favourite,
+)
+from auction_api.main_page import (
+    get_main_page,
+    get_main_page_etag,
+    invalidate_main_page,
+    refresh_main_page,
+)
+from auction_api.models import (
+    AuctionLot,
+    AuctionLotImage,
+    Bid,
+    Category,
+    ProxyBid,
+)
+from auction_api.notifications import notify_closing_soon
+from auction_api.pagination import AuctionLotCursorPagination
+from auction_api.serializers import DETAIL_BIDS
+from auction_api.tasks import (
+    CLOSE_SCHEDULE_HORIZON,
+    close_auction_lot,
+    close_auction_lots,
+    process_lot_image,
+    schedule_lot_closing,
+)
+from auction_api.views import AuctionLotViewSet
+from auction_service.db_router import (
+    PrimaryReplicaRouter,
+    ReplicaRoutingMiddleware,
+    use_primary,
+)
+from auction_service.logging import QueueListenerHandler
+from auction_service.metrics import REQUEST_QUERIES, install_query_recorder
+from user.authentication import StatelessReadJWTAuthentication
+
+User = get_user_model()
+
+
+def create_user(email):
+    return User.objects.create_user(email=email, password="password123")
+
+
+def create_lot(owner, **fields):
+    fields = {
+        "item_name": "Vintage watch",
+        "description": "A watch",
+        "location": "Kyiv",
+        "initial_price": Decimal(100),
+        "min_step": Decimal(5),
+        "buyout_price": Decimal(1000),
+        "close_time": now() + timedelta(days=1),
+        "owner": owner,
+        **fields,
+    }
+    return AuctionLot.objects.create(**fields)
+
+
+class AuctionLotEditTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.bidder = create_user("bidder@example.com")
+        self.lot = create_lot(self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_save_of_stale_copy_keeps_bid_stats(self):
+        stale = AuctionLot.objects.get(id=self.lot.id)
+        place_bid(self.lot.id, self.bidder, Decimal(110))
+
+        stale.item_name = "Antique watch"
+        stale.save()
+
+        lot = AuctionLot.objects.get(id=self.lot.id)
+        self.assertEqual(lot.item_name, "Antique watch")
+        self.assertEqual(lot.bid_count, 1)
+        self.assertEqual(lot.current_price, Decimal(110))
+        self.assertEqual(lot.leading_bidder, self.bidder)
+
+    def test_update_writes_only_edited_fields(self):
+        place_bid(self.lot.id, self.bidder, Decimal(110))
+        AuctionLot.objects.filter(id=self.lot.id).update(is_active=False)
+
+        response = self.client.put(
+            reverse("auction-api:auction-lots-detail", args=[self.lot.id]),
+            {
+                "item_name": "Antique watch",
+                "description": "A watch",
+                "location": "Kyiv",
+                "initial_price": "100",
+                "min_step": "5",
+                "buyout_price": "1000",
+                "close_time": (now() + timedelta(days=2)).isoformat(),
+                "images": [],
+                "is_active": True,
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        lot = AuctionLot.objects.get(id=self.lot.id)
+        self.assertEqual(lot.item_name, "Antique watch")
+        self.assertEqual(lot.bid_count, 1)
+        self.assertEqual(lot.leading_bidder, self.bidder)
+        self.assertFalse(lot.is_active)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        owner = create_user("owner@example.com")
+        lot = create_lot(owner)
+        place_bid(lot.id, create_user("bidder@example.com"), Decimal(110))
+        output = StringIO()
+
+        call_command("check_query_plans", stdout=output)
+
+        self.assertIn("All hot queries use indexes!", output.getvalue())
+
+
+class BackfillMigrationTests(TestCase):
+    def run_migration(self, name, function):
+        module = importlib.import_module(f"auction_api.migrations.{name}")
+        getattr(module, function)(apps, None)
+
+    def test_bid_stats_are_backfilled(self):
+        owner, bidder = create_user("owner@example.com"), create_user("b@example.com")
+        lot, empty_lot = create_lot(owner), create_lot(owner)
+        place_bid(lot.id, bidder, Decimal(110))
+        place_bid(lot.id, create_user("c@example.com"), Decimal(120))
+        # As left by 0002 on lots that had bids before it.
+        AuctionLot.objects.update(
+            current_price=None, bid_count=0, leading_bidder=None, last_bid_at=None
+        )
+
+        self.run_migration("0011_backfill_lot_bid_stats", "backfill_bid_stats")
+
+        lot.refresh_from_db()
+        self.assertEqual(lot.current_price, Decimal(120))
+        self.assertEqual(lot.bid_count, 2)
+        self.assertEqual(lot.leading_bidder.email, "c@example.com")
+        self.assertEqual(lot.last_bid_at, lot.bids.latest("bid_time").bid_time)
+        empty_lot.refresh_from_db()
+        self.assertIsNone(empty_lot.current_price)
+        self.assertEqual(empty_lot.bid_count, 0)
+
+    def test_favourites_count_is_backfilled(self):
+        owner = create_user("owner@example.com")
+        lot = create_lot(owner)
+        lot.favourites.add(owner, create_user("fan@example.com"))
+        # As left by 0008 on lots favourited before it.
+        AuctionLot.objects.update(favourites_count=0)
+
+        self.run_migration(
+            "0012_backfill_favourites_count", "backfill_favourites_count"
+        )
+
+        self.assertEqual(AuctionLot.objects.get(id=lot.id).favourites_count, 2)
+        self.assertFalse(toggle_favourite(owner.id, lot.id))
+        self.assertEqual(AuctionLot.objects.get(id=lot.id).favourites_count, 1)
+
+
+class NotFoundTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(create_user("user@example.com"))
+
+    def test_non_integer_pk_is_not_found(self):
+        for url in (
+            reverse("auction-api:auction-lots-detail", args=["abc"]),
+            "/api/auction-lots/abc/bids/",
+        ):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"abc"')
+            self.assertEqual(response.status_code, 404, url)
+
+
+class MainPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = create_user("owner@example.com")
+        for number in range(5):
+            create_lot(self.owner, item_name=f"Lot {number}")
+
+    def test_invalidated_page_is_rebuilt_once_in_the_background(self):
+        refresh_main_page()
+        etag = get_main_page_etag()
+        invalidate_main_page()
+
+        with mock.patch("auction_api.tasks.delay_task") as delay_task:
+            with self.assertNumQueries(0):
+                for _ in range(5):
+                    self.assertEqual(len(get_main_page()["also_like"]), 5)
+            self.assertEqual(get_main_page_etag(), etag)
+
+        delay_task.assert_called_once()
+        refresh_main_page(*delay_task.call_args.args[1:])
+        self.assertNotEqual(get_main_page_etag(), etag)
+
+    def test_cold_cache_is_built_by_the_request(self):
+        page = get_main_page()
+
+        self.assertEqual(len(page["new"]), 4)
+        self.assertEqual(len(page["also_like"]), 5)
+
+
+class QueryCountTests(TestCase):
+    """The number of queries of the read endpoints doesn't grow with the data."""
+
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.bidder = create_user("bidder@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.bidder)
+
+    def create_data(self, count):
+        lots = AuctionLot.objects.bulk_create(
+            AuctionLot(
+                item_name=f"Lot {number}",
+                description="A lot",
+                location="Kyiv",
+                initial_price=Decimal(100),
+                min_step=Decimal(5),
+                buyout_price=Decimal(10**6),
+                close_time=now() + timedelta(days=1),
+                owner=self.owner,
+            )
+            for number in range(count)
+        )
+        AuctionLotImage.objects.bulk_create(
+            AuctionLotImage(lot=lot, image="lot_images/placeholder.jpg") for lot in lots
+        )
+        lot = lots[0]
+        for number in range(count):
+            place_bid(lot.id, self.bidder, Decimal(105 + 5 * number))
+        return lot
+
+    def test_read_endpoints(self):
+        for count in (1, 50, 500):
+            with self.subTest(count=count):
+                lot = self.create_data(count)
+                requests = [
+                    (reverse("auction-api:auction-lots-list"), 2),
+                    (reverse("auction-api:auction-lots-detail", args=[lot.id]), 3),
+                    (reverse("auction-api:bid-list-create", args=[lot.id]), 2),
+                    (reverse("auction-api:auction-lots-favourites"), 1),
+                ]
+                for url, queries in requests:
+                    with self.assertNumQueries(queries):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200, url)
+
+    def test_detail_lists_latest_bids_only(self):
+        lot = self.create_data(DETAIL_BIDS + 5)
+
+        response = self.client.get(
+            reverse("auction-api:auction-lots-detail", args=[lot.id])
+        )
+
+        latest = list(
+            lot.bids.order_by("-bid_time", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(response.data["bids"], latest[:DETAIL_BIDS])
+        self.assertIn("favourites", response.data)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.bidder = create_user("bidder@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.bidder)
+
+    def get_all_pages(self, url, inserted=None):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+            if inserted:
+                inserted()
+                inserted = None
+        return ids
+
+    def test_lots_are_listed_once_each_newest_first(self):
+        lots = [create_lot(self.owner, item_name=f"Lot {n}") for n in range(45)]
+        # Ties on created_at are broken by id.
+        AuctionLot.objects.filter(id__in=[lot.id for lot in lots[10:30]]).update(
+            created_at=lots[10].created_at
+        )
+        expected = list(
+            AuctionLot.objects.order_by("-created_at", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+        ids = self.get_all_pages(
+            reverse("auction-api:auction-lots-list") + "?page_size=20",
+            inserted=lambda: create_lot(self.owner, item_name="New lot"),
+        )
+
+        self.assertEqual(ids, expected)
+
+    def test_previous_links_walk_back_through_the_same_pages(self):
+        lots = [create_lot(self.owner, item_name=f"Lot {n}") for n in range(12)]
+        AuctionLot.objects.filter(id__in=[lot.id for lot in lots[2:9]]).update(
+            created_at=lots[2].created_at
+        )
+        url = reverse("auction-api:auction-lots-list") + "?page_size=5"
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append([item["id"] for item in response.data["results"]])
+            url = response.data["next"]
+
+        url = response.data["previous"]
+        for page in reversed(pages[:-1]):
+            response = self.client.get(url)
+            self.assertEqual([item["id"] for item in response.data["results"]], page)
+            url = response.data["previous"]
+        self.assertIsNone(url)
+
+    def test_invalid_cursor_is_not_found(self):
+        pagination = AuctionLotCursorPagination()
+        pagination.base_url = "http://testserver" + reverse(
+            "auction-api:auction-lots-list"
+        )
+        url = pagination.encode_cursor(Cursor(0, False, '["not a date", 1]'))
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_bids_are_listed_newest_first(self):
+        lot = create_lot(self.owner)
+        for number in range(12):
+            place_bid(lot.id, self.bidder, Decimal(105 + 5 * number))
+        expected = list(
+            lot.bids.order_by("-bid_time", "-id").values_list("id", flat=True)
+        )
+
+        ids = self.get_all_pages(
+            reverse("auction-api:bid-list-create", args=[lot.id]) + "?page_size=5"
+        )
+
+        self.assertEqual(ids, expected)
+
+    def test_page_size_is_capped(self):
+        for number in range(3):
+            create_lot(self.owner, item_name=f"Lot {number}")
+
+        with mock.patch.object(AuctionLotCursorPagination, "max_page_size", 2):
+            response = self.client.get(
+                reverse("auction-api:auction-lots-list") + "?page_size=1000"
+            )
+
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+class LotClosingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = create_user("owner@example.com")
+        self.bidder = create_user("bidder@example.com")
+        self.lot = create_lot(self.owner)
+        place_bid(self.lot.id, self.bidder, Decimal(110))
+
+        patcher = mock.patch("auction_api.tasks.delay_task")
+        self.delay_task = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def expire(self, lot):
+        close_time = now() - timedelta(seconds=1)
+        AuctionLot.objects.filter(id=lot.id).update(close_time=close_time)
+        return close_time
+
+    def test_close_sets_the_winner(self):
+        self.expire(self.lot)
+
+        close_auction_lot(self.lot.id)
+
+        lot = AuctionLot.objects.get(id=self.lot.id)
+        self.assertFalse(lot.is_active)
+        self.assertEqual(lot.winner, self.bidder)
+
+    def test_moved_close_time_rearms_the_task(self):
+        close_time = now() + timedelta(minutes=1)
+        AuctionLot.objects.filter(id=self.lot.id).update(close_time=close_time)
+
+        close_auction_lot(self.lot.id)
+
+        self.assertTrue(AuctionLot.objects.get(id=self.lot.id).is_active)
+        self.delay_task.assert_called_once_with(
+            close_auction_lot, self.lot.id, eta=close_time
+        )
+
+    def test_close_time_moved_while_waiting_for_the_lock_rearms_the_task(self):
+        close_time = now() + timedelta(minutes=1)
+        AuctionLot.objects.filter(id=self.lot.id).update(close_time=close_time)
+        # The first read sees the old close time, the locked re-check the new one.
+        times = iter([close_time + timedelta(seconds=1), now(), now()])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch("auction_api.tasks.now", side_effect=lambda: next(times)):
+                close_auction_lot(self.lot.id)
+
+        self.assertTrue(AuctionLot.objects.get(id=self.lot.id).is_active)
+        self.delay_task.assert_called_once_with(
+            close_auction_lot, self.lot.id, eta=close_time
+        )
+
+    def test_lots_beyond_the_horizon_are_armed_by_the_sweep(self):
+        far_close_time = now() + CLOSE_SCHEDULE_HORIZON + timedelta(minutes=5)
+        schedule_lot_closing(self.lot.id, far_close_time)
+        self.delay_task.assert_not_called()
+        AuctionLot.objects.filter(id=self.lot.id).update(close_time=far_close_time)
+
+        close_auction_lots()
+        self.delay_task.assert_not_called()
+
+        with mock.patch(
+            "auction_api.tasks.now", return_value=far_close_time - timedelta(minutes=1)
+        ):
+            close_auction_lots()
+            close_auction_lots()
+
+        self.delay_task.assert_called_once_with(
+            close_auction_lot, self.lot.id, eta=far_close_time
+        )
+
+
+class CloseSweepTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.bidder = create_user("bidder@example.com")
+
+    def test_expired_lots_are_closed_in_batches(self):
+        lots = [create_lot(self.owner, item_name=f"Lot {n}") for n in range(5)]
+        place_bid(lots[0].id, self.bidder, Decimal(110))
+        AuctionLot.objects.filter(id__in=[lot.id for lot in lots[:4]]).update(
+            close_time=now() - timedelta(minutes=1)
+        )
+
+        with mock.patch("auction_api.tasks.delay_task"):
+            stats = close_auction_lots(batch_size=3)
+
+        self.assertEqual(stats["lots_closed"], 4)
+        self.assertEqual(stats["batches"], 2)
+        self.assertGreaterEqual(stats["max_lag_seconds"], 60)
+        self.assertEqual(
+            set(AuctionLot.objects.filter(is_active=True).values_list("id", flat=True)),
+            {lots[4].id},
+        )
+        self.assertEqual(AuctionLot.objects.get(id=lots[0].id).winner, self.bidder)
+        self.assertIsNone(AuctionLot.objects.get(id=lots[1].id).winner)
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs SKIP LOCKED")
+class ConcurrentCloseSweepTests(TransactionTestCase):
+    def test_locked_lots_are_skipped(self):
+        owner = create_user("owner@example.com")
+        locked, free = (create_lot(owner, item_name=name) for name in ("a", "b"))
+        AuctionLot.objects.update(close_time=now() - timedelta(minutes=1))
+        locked_row = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with transaction.atomic():
+                AuctionLot.objects.select_for_update().get(id=locked.id)
+                locked_row.set()
+                release.wait(10)
+            connections.close_all()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked_row.wait(10)
+        try:
+            stats = close_auction_lots()
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(stats["lots_closed"], 1)
+        self.assertTrue(AuctionLot.objects.get(id=locked.id).is_active)
+        self.assertFalse(AuctionLot.objects.get(id=free.id).is_active)
+
+
+class LotEventsTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.lot = create_lot(self.owner)
+        self.url = reverse("auction-api:auction-lot-events", args=[self.lot.id])
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, 401)
+
+    async def test_streams_the_state_then_the_events(self):
+        response = await self.async_client.get(
+            self.url,
+            headers={"Authorization": f"Bearer {AccessToken.for_user(self.owner)}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        chunks = aiter(response.streaming_content)
+
+        state = await anext(chunks)
+        publish_lot_event(self.lot.id, "bid", {"offered_price": "105"})
+        event = await asyncio.wait_for(anext(chunks), timeout=1)
+        await chunks.aclose()
+
+        self.assertTrue(state.startswith(b"event: state\n"))
+        self.assertIn(b'"bid_count": 0', state)
+        self.assertEqual(event, b'event: bid\ndata: {"offered_price": "105"}\n\n')
+
+
+class FakePubSub:
+    """Redis pub/sub that confirms the subscription once `confirm` is set."""
+
+    def __init__(self):
+        self.confirm = asyncio.Event()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def psubscribe(self, pattern):
+        pass
+
+    async def listen(self):
+        await self.confirm.wait()
+        yield {"type": "psubscribe", "channel": b"auction_lot:*", "data": 1}
+        await asyncio.Event().wait()
+
+
+class RedisEventBackendTests(SimpleTestCase):
+    async def test_subscribe_waits_for_the_redis_subscription(self):
+        pubsub = FakePubSub()
+        client = mock.Mock(pubsub=mock.Mock(return_value=pubsub))
+        with mock.patch("redis.Redis.from_url"), mock.patch(
+            "redis.asyncio.Redis.from_url", return_value=client
+        ):
+            backend = RedisEventBackend("redis://redis")
+            subscribing = asyncio.ensure_future(backend.subscribe("auction_lot:1"))
+
+            await asyncio.sleep(0.05)
+            self.assertFalse(subscribing.done())
+
+            pubsub.confirm.set()
+            queue = await asyncio.wait_for(subscribing, timeout=1)
+
+        backend._dispatch("auction_lot:1", "message")
+        self.assertEqual(await asyncio.wait_for(queue.get(), timeout=1), "message")
+        backend._listener.cancel()
+
+
+class EventFanoutBenchmarkTests(SimpleTestCase):
+    def test_every_subscriber_receives_every_event(self):
+        output = StringIO()
+
+        call_command("bench_event_fanout", subscribers=5, events=2, stdout=output)
+
+        self.assertIn("deliveries: 10", output.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImageProcessingTests(TestCase):
+    def setUp(self):
+        self.lot = create_lot(create_user("owner@example.com"))
+        buffer = BytesIO()
+        Image.new("RGB", (3000, 1000), "red").save(buffer, format="JPEG")
+        with mock.patch("auction_api.signals.delay_task"):
+            self.lot_image = AuctionLotImage.objects.create(
+                lot=self.lot, image=ContentFile(buffer.getvalue(), name="photo.jpg")
+            )
+        self.storage = self.lot_image.image.storage
+        self.original_name = self.lot_image.image.name
+
+    def test_image_is_replaced_with_the_reencoded_one(self):
+        process_lot_image(self.lot_image.id)
+
+        lot_image = AuctionLotImage.objects.get(id=self.lot_image.id)
+        self.assertNotEqual(lot_image.image.name, self.original_name)
+        self.assertFalse(self.storage.exists(self.original_name))
+        self.assertEqual((lot_image.width, lot_image.height), (2048, 683))
+        for field_file in (lot_image.image, lot_image.thumbnail, lot_image.webp):
+            self.assertTrue(self.storage.exists(field_file.name))
+
+    def test_main_page_stops_serving_the_original(self):
+        cache.clear()
+        refresh_main_page()
+
+        process_lot_image(self.lot_image.id)
+
+        (image,) = get_main_page()["new"][0]["images"]
+        self.assertNotIn(self.original_name, image["image"])
+        self.assertIsNotNone(image["thumbnail"])
+
+    def test_failed_encoding_keeps_the_original(self):
+        with mock.patch("auction_api.images._encode", side_effect=OSError):
+            with self.assertRaises(OSError):
+                process_lot_image(self.lot_image.id)
+
+        lot_image = AuctionLotImage.objects.get(id=self.lot_image.id)
+        self.assertEqual(lot_image.image.name, self.original_name)
+        self.assertTrue(self.storage.exists(self.original_name))
+
+    def test_fixtures_are_not_processed(self):
+        category = Category(id=1, name="Watches", image="images/categories/a.jpg")
+        fixture = serializers.serialize("json", [self.lot_image, category])
+        AuctionLotImage.objects.all().delete()
+
+        with mock.patch("auction_api.signals.delay_task") as delay_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                for obj in serializers.deserialize("json", fixture):
+                    obj.save()
+
+        delay_task.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, format="PNG")
+        self.image_files = {
+            "good.png": SimpleUploadedFile("good.png", buffer.getvalue()),
+            "broken.png": SimpleUploadedFile("broken.png", buffer.getvalue()[:40]),
+            "text.png": SimpleUploadedFile("text.png", b"not an image"),
+        }
+
+    def import_rows(self, *images):
+        row = {
+            "item_name": "Vintage watch",
+            "description": "A watch",
+            "location": "Kyiv",
+            "initial_price": "100",
+            "min_step": "5",
+            "buyout_price": "1000",
+            "close_time": (now() + timedelta(days=1)).isoformat(),
+        }
+        with mock.patch("auction_api.bulk_import.delay_task"):
+            return import_lots(
+                [{**row, "images": [name]} for name in images],
+                self.owner,
+                self.image_files,
+            )
+
+    def test_rows_with_invalid_images_are_rejected(self):
+        report = self.import_rows("good.png", "broken.png", "text.png", "good.png")
+
+        self.assertEqual(report["created"], 2)
+        self.assertEqual([error["row"] for error in report["errors"]], [2, 3])
+        self.assertEqual(AuctionLotImage.objects.count(), 2)
+
+    def test_rows_with_too_large_images_are_rejected(self):
+        with mock.patch("auction_api.bulk_import.MAX_UPLOAD_SIZE", 10):
+            report = self.import_rows("good.png")
+
+        self.assertEqual(report["created"], 0)
+        self.assertIn("must not exceed", str(report["errors"][0]["errors"]))
+
+
+class PopulateDbTests(TestCase):
+    def populate(self, **options):
+        options = {
+            "users": 5,
+            "bids": 50,
+            "favourites": 10,
+            "images_per_lot": 0,
+            "workers": 1,
+            **options,
+        }
+        call_command(
+            "populate_db",
+            *(f"--{name}={value}" for name, value in options.items()),
+            stdout=StringIO(),
+        )
+
+    def test_without_lots(self):
+        self.populate(lots=0)
+
+        self.assertFalse(AuctionLot.objects.exists())
+
+    def test_expired_lots_are_closed(self):
+        self.populate(lots=100)
+
+        self.assertFalse(
+            AuctionLot.objects.filter(is_active=True, close_time__lte=now()).exists()
+        )
+        expired = AuctionLot.objects.filter(close_time__lte=now())
+        self.assertTrue(expired.filter(bid_count=0).exists())
+        self.assertFalse(expired.filter(bid_count__gt=0, winner=None).exists())
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        # The test connection was opened before the metrics module connected
+        # to connection_created.
+        install_query_recorder(connection)
+        self.user = create_user("user@example.com")
+        self.lot = create_lot(self.user)
+        self.url = reverse("auction-api:auction-lots-detail", args=[self.lot.id])
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    def recorded_queries(self):
+        key = (("view", "auction-api:auction-lots-detail"),)
+        counts = REQUEST_QUERIES._values.get(key, [0])
+        return counts[-1]
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_are_disabled_without_a_token(self):
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_require_the_token(self):
+        url = reverse("metrics")
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(url, headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_queries_are_recorded_under_wsgi(self):
+        recorded = self.recorded_queries()
+
+        self.client.get(self.url, headers=self.headers)
+
+        self.assertGreater(self.recorded_queries(), recorded)
+
+    async def test_queries_of_sync_views_are_recorded_under_asgi(self):
+        recorded = self.recorded_queries()
+
+        await self.async_client.get(self.url, headers=self.headers)
+
+        self.assertGreater(self.recorded_queries(), recorded)
+
+
+class QueueListenerHandlerTests(TestCase):
+    def write_record(self, handler, message):
+        handler.handle(logging.makeLogRecord({"msg": message}))
+
+    @skipUnless(hasattr(os, "fork"), "Needs os.fork()")
+    def test_forked_child_writes_its_records(self):
+        read_fd, write_fd = os.pipe()
+        stream = os.fdopen(write_fd, "w")
+        handler = QueueListenerHandler(stream)
+        self.write_record(handler, "parent")
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.write_record(handler, "child")
+                handler.close()
+                stream.close()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        handler.close()
+        stream.close()
+
+        with os.fdopen(read_fd) as output:
+            self.assertEqual(sorted(output.read().split()), ["child", "parent"])
+
+
+class FavouriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("user@example.com")
+        self.lot = create_lot(self.user)
+
+    def toggle(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return toggle_favourite(self.user.id, self.lot.id)
+
+    def test_toggle(self):
+        self.assertTrue(self.toggle())
+        self.assertEqual(get_favourite_ids(self.user.id), {self.lot.id})
+        self.assertFalse(self.toggle())
+        self.assertEqual(get_favourite_ids(self.user.id), set())
+        self.assertEqual(AuctionLot.objects.get(id=self.lot.id).favourites_count, 0)
+
+    def test_set_read_before_a_toggle_is_not_served_after_it(self):
+        self.assertEqual(get_favourite_ids(self.user.id), set())
+        # A concurrent request read the set before the toggle committed
+        # and caches it after the toggle invalidated the cache.
+        stale_key = _get_cache_key(self.user.id)
+        self.toggle()
+        cache.set(stale_key, set())
+
+        self.assertEqual(get_favourite_ids(self.user.id), {self.lot.id})
+
+    def test_non_integer_pk_is_not_found(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("auction-api:auction-lots-toggle-favourite", args=["abc"])
+
+        self.assertEqual(client.get(url).status_code, 404)
+        self.assertEqual(client.post(url).status_code, 404)
+
+
+class BidPlacementTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.bidder = create_user("bidder@example.com")
+        self.other_bidder = create_user("other@example.com")
+        self.lot = create_lot(self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.bidder)
+        self.url = reverse("auction-api:bid-list-create", args=[self.lot.id])
+
+    def test_bid_updates_the_lot(self):
+        response = self.client.post(self.url, {"offered_price": "110"})
+
+        self.assertEqual(response.status_code, 201, response.content)
+        lot = AuctionLot.objects.get(id=self.lot.id)
+        self.assertEqual(lot.current_price, Decimal(110))
+        self.assertEqual(lot.bid_count, 1)
+        self.assertEqual(lot.leading_bidder, self.bidder)
+        self.assertEqual(lot.last_bid_at, Bid.objects.get().bid_time)
+
+    def test_bid_must_beat_the_current_price_by_a_step(self):
+        place_bid(self.lot.id, self.other_bidder, Decimal(110))
+
+        for price in ("110", "114"):
+            response = self.client.post(self.url, {"offered_price": price})
+            self.assertEqual(response.status_code, 400, price)
+        self.assertEqual(AuctionLot.objects.get(id=self.lot.id).bid_count, 1)
+
+    def test_bid_outdated_by_a_concurrent_one_conflicts(self):
+        place_bid(self.lot.id, self.other_bidder, Decimal(110))
+
+        with self.assertRaises(BidConflictError):
+            place_bid(self.lot.id, self.bidder, Decimal(110), expected_bid_count=0)
+        with self.assertRaises(ValidationError) as context:
+            place_bid(self.lot.id, self.bidder, Decimal(110), expected_bid_count=1)
+        self.assertNotIsInstance(context.exception, BidConflictError)
+
+    def test_conflict_answers_409(self):
+        with mock.patch(
+            "auction_api.views.place_bid", side_effect=BidConflictError("Outbid.")
+        ):
+            response = self.client.post(self.url, {"offered_price": "110"})
+
+        self.assertEqual(response.status_code, 409)
+
+
+class BuyoutTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.buyer = create_user("buyer@example.com")
+        self.lot = create_lot(self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def buyout(self, pk):
+        return self.client.post(reverse("auction-api:auction-lots-buyout", args=[pk]))
+
+    def test_buyout_closes_the_lot(self):
+        response = self.buyout(self.lot.id)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Decimal(response.data["offered_price"]), Decimal(1000))
+        lot = AuctionLot.objects.get(id=self.lot.id)
+        self.assertFalse(lot.is_active)
+        self.assertEqual(lot.winner, self.buyer)
+        self.assertEqual(lot.current_price, Decimal(1000))
+
+    def test_closed_lot_cant_be_bought_out(self):
+        self.buyout(self.lot.id)
+
+        response = self.buyout(self.lot.id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AuctionLot.objects.get(id=self.lot.id).bid_count, 1)
+
+    def test_bid_above_the_buyout_price_buys_the_lot_out(self):
+        bid = place_bid(self.lot.id, self.buyer, Decimal(5000))
+
+        self.assertEqual(bid.offered_price, Decimal(1000))
+        self.assertFalse(AuctionLot.objects.get(id=self.lot.id).is_active)
+
+    def test_non_integer_pk_is_not_found(self):
+        self.assertEqual(self.buyout("abc").status_code, 404)
+
+
+def run_concurrently(*calls):
+    """Run the calls in threads at the same time, returning results or errors."""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(index, call):
+        barrier.wait()
+        try:
+            results[index] = call()
+        except Exception as error:
+            results[index] = error
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=run, args=(index, call))
+        for index, call in enumerate(calls)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs row locks")
+class ConcurrentBidTests(TransactionTestCase):
+    def test_concurrent_bids_are_applied_one_after_another(self):
+        owner = create_user("owner@example.com")
+        bidders = [create_user(f"bidder{number}@example.com") for number in range(8)]
+        lot = create_lot(owner)
+
+        results = run_concurrently(
+            *(
+                lambda bidder=bidder, number=number: place_bid(
+                    lot.id, bidder, Decimal(110 + 5 * (number % 4))
+                )
+                for number, bidder in enumerate(bidders)
+            )
+        )
+
+        bids = [result for result in results if isinstance(result, Bid)]
+        lot.refresh_from_db()
+        self.assertEqual(lot.bid_count, len(bids))
+        self.assertEqual(Bid.objects.filter(auction_lot=lot).count(), len(bids))
+        prices = [bid.offered_price for bid in sorted(bids, key=lambda bid: bid.id)]
+        self.assertEqual(prices, sorted(set(prices)))
+        self.assertEqual(lot.current_price, prices[-1])
+
+
+@skipUnless(connection.vendor == "postgresql", "Needs row locks")
+class ConcurrentBuyoutTests(TransactionTestCase):
+    def test_only_one_of_concurrent_buyouts_wins(self):
+        owner = create_user("owner@example.com")
+        buyers = [create_user(f"buyer{number}@example.com") for number in range(5)]
+        lot = create_lot(owner)
+
+        results = run_concurrently(
+            *(lambda buyer=buyer: buy_out(lot.id, buyer) for buyer in buyers)
+        )
+
+        bids = [result for result in results if not isinstance(result, Exception)]
+        self.assertEqual(len(bids), 1)
+        lot.refresh_from_db()
+        self.assertEqual(lot.winner_id, bids[0].bidder_id)
+        self.assertEqual(lot.bid_count, 1)
+
+
+class ProxyBidTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.first, self.second, self.bidder = (
+            create_user(f"{name}@example.com") for name in ("first", "second", "bidder")
+        )
+        self.lot = create_lot(self.owner)
+
+        patcher = mock.patch("auction_api.bidding.notify_outbid")
+        self.notify_outbid = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("auction_api.bidding.publish_lot_event")
+        self.publish_lot_event = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_on_commit(self, call, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            return call(self.lot.id, *args)
+
+    def assert_leads(self, bidder, price):
+        self.lot.refresh_from_db()
+        self.assertEqual(self.lot.leading_bidder, bidder)
+        self.assertEqual(self.lot.current_price, Decimal(price))
+
+    def test_the_highest_maximum_leads_a_step_above_the_runner_up(self):
+        self.run_on_commit(set_proxy_bid, self.first, Decimal(200))
+        self.assert_leads(self.first, 105)
+
+        self.run_on_commit(set_proxy_bid, self.second, Decimal(150))
+        self.assert_leads(self.first, 155)
+        self.assertEqual(self.lot.bid_count, 3)
+        self.assertFalse(ProxyBid.objects.get(bidder=self.second).is_active)
+
+    def test_maximum_too_close_to_outbid_by_a_step_is_bid_in_full(self):
+        self.run_on_commit(set_proxy_bid, self.first, Decimal(152))
+        self.run_on_commit(set_proxy_bid, self.second, Decimal(150))
+
+        self.assert_leads(self.first, 152)
+
+    def test_equal_maximums_go_to_the_leader(self):
+        self.run_on_commit(set_proxy_bid, self.first, Decimal(150))
+        self.run_on_commit(set_proxy_bid, self.second, Decimal(150))
+
+        self.assert_leads(self.first, 150)
+
+    def test_proxy_answers_explicit_bids(self):
+        self.run_on_commit(set_proxy_bid, self.first, Decimal(200))
+
+        bid = self.run_on_commit(place_bid, self.bidder, Decimal(120))
+
+        self.assertEqual(bid.bidder, self.bidder)
+        self.assert_leads(self.first, 125)
+
+    def test_only_the_replaced_leader_is_notified(self):
+        self.run_on_commit(set_proxy_bid, self.first, Decimal(200))
+        self.run_on_commit(set_proxy_bid, self.second, Decimal(150))
+        self.run_on_commit(place_bid, self.bidder, Decimal(180))
+        self.notify_outbid.assert_not_called()
+
+        self.run_on_commit(place_bid, self.bidder, Decimal(300))
+
+        self.notify_outbid.assert_called_once_with(self.first.id, self.lot.id)
+
+    def test_events_describe_the_lot_after_each_bid(self):
+        self.run_on_commit(set_proxy_bid, self.first, Decimal(200))
+        self.run_on_commit(set_proxy_bid, self.second, Decimal(150))
+
+        events = [call.args[2] for call in self.publish_lot_event.call_args_list]
+        self.assertEqual(
+            [(event["current_price"], event["bid_count"]) for event in events],
+            [(Decimal(105), 1), (Decimal(150), 2), (Decimal(155), 3)],
+        )
+
+    def test_get_with_stateless_reads(self):
+        self.run_on_commit(set_proxy_bid, self.first, Decimal(200))
+        url = reverse("auction-api:auction-lots-proxy-bid", args=[self.lot.id])
+        token = AccessToken.for_user(self.first)
+
+        with mock.patch.object(
+            AuctionLotViewSet,
+            "authentication_classes",
+            [StatelessReadJWTAuthentication],
+        ):
+            response = self.client.get(
+                url, headers={"Authorization": f"Bearer {token}"}
+            )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Decimal(response.data["max_price"]), Decimal(200))
+
+    def test_non_integer_pk_is_not_found(self):
+        client = APIClient()
+        client.force_authenticate(self.first)
+        url = reverse("auction-api:auction-lots-proxy-bid", args=["abc"])
+
+        self.assertEqual(client.get(url).status_code, 404)
+        self.assertEqual(client.post(url, {"max_price": "200"}).status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.route_read)
+
+    def route_read(self, request):
+        self.read_from = self.router.db_for_read(AuctionLot)
+        with use_primary():
+            self.primary_read_from = self.router.db_for_read(AuctionLot)
+        return HttpResponse(status=getattr(request, "status", 200))
+
+    def request(self, method, token="token", status=200):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        request = getattr(self.factory, method)("/", headers=headers)
+        request.status = status
+        self.middleware(request)
+        return self.read_from
+
+    def test_safe_requests_read_from_replicas(self):
+        self.assertEqual(self.request("get"), "replica_1")
+        self.assertEqual(self.primary_read_from, "default")
+        self.assertEqual(self.request("post"), "default")
+
+    def test_reads_outside_requests_go_to_the_primary(self):
+        self.assertEqual(self.router.db_for_read(AuctionLot), "default")
+        self.assertEqual(self.router.db_for_write(AuctionLot), "default")
+
+    def test_client_is_pinned_to_the_primary_after_a_write(self):
+        self.request("post")
+
+        self.assertEqual(self.request("get"), "default")
+        self.assertEqual(self.request("get", token="other"), "replica_1")
+        self.assertEqual(self.request("get", token=None), "replica_1")
+
+    def test_failed_writes_dont_pin(self):
+        self.request("post", status=400)
+
+        self.assertEqual(self.request("get"), "replica_1")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.request("get"), "default")
+
+
+def run_task(task, *args, **options):
+    return task(*args)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = create_user("owner@example.com")
+        self.first = create_user("first@example.com")
+        self.second = create_user("second@example.com")
+        self.lot = create_lot(self.owner)
+
+        patcher = mock.patch("auction_api.tasks.delay_task", side_effect=run_task)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def bid(self, bidder, price):
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(self.lot.id, bidder, Decimal(price))
+
+    def test_outbid_bidder_is_emailed_once_per_window(self):
+        self.bid(self.first, 110)
+        self.assertEqual(mail.outbox, [])
+
+        self.bid(self.second, 120)
+        self.bid(self.first, 130)
+        self.bid(self.second, 140)
+
+        self.assertEqual(
+            [(message.to, message.subject) for message in mail.outbox],
+            [
+                (["first@example.com"], "You have been outbid on Vintage watch"),
+                (["second@example.com"], "You have been outbid on Vintage watch"),
+            ],
+        )
+
+    def test_winner_is_emailed_when_the_lot_closes(self):
+        self.bid(self.first, 110)
+        AuctionLot.objects.filter(id=self.lot.id).update(
+            close_time=now() - timedelta(seconds=1)
+        )
+
+        close_auction_lot(self.lot.id)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["first@example.com"])
+        self.assertEqual(mail.outbox[0].subject, "You won Vintage watch")
+
+    def test_watchers_are_emailed_once_when_the_lot_closes_soon(self):
+        AuctionLot.objects.filter(id=self.lot.id).update(
+            close_time=now() + timedelta(minutes=30)
+        )
+        self.lot.favourites.add(self.first, self.second)
+        self.second.is_active = False
+        self.second.save()
+
+        self.assertEqual(notify_closing_soon(), 1)
+        self.assertEqual(notify_closing_soon(), 0)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["first@example.com"])
+        self.assertEqual(mail.outbox[0].subject, "Vintage watch closes soon")
+
+
+class SoftCloseTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("owner@example.com")
+        self.bidder = create_user("bidder@example.com")
+
+    def create_lot(self, close_in, window=120, extension=300):
+        return create_lot(
+            self.owner,
+            close_time=now() + close_in,
+            soft_close_window=window,
+            soft_close_extension=extension,
+        )
+
+    def test_bid_in_the_window_extends_the_lot(self):
+        lot = self.create_lot(timedelta(seconds=60))
+
+        bid = place_bid(lot.id, self.bidder, Decimal(110))
+
+        lot.refresh_from_db()
+        self.assertEqual(lot.close_time, bid.bid_time + timedelta(seconds=300))
+
+    def test_bid_before_the_window_keeps_the_close_time(self):
+        lot = self.create_lot(timedelta(minutes=10))
+
+        place_bid(lot.id, self.bidder, Decimal(110))
+
+        self.assertEqual(AuctionLot.objects.get(id=lot.id).close_time, lot.close_time)
+
+    def test_extension_never_shortens_the_lot(self):
+        lot = self.create_lot(timedelta(seconds=100), extension=30)
+
+        place_bid(lot.id, self.bidder, Decimal(110))
+
+        self.assertEqual(AuctionLot.objects.get(id=lot.id).close_time, lot.close_time)
+
+    def test_disabled_by_default(self):
+        lot = create_lot(self.owner, close_time=now() + timedelta(seconds=30))
+
+        place_bid(lot.id, self.bidder, Decimal(110))
+
+        self.assertEqual(AuctionLot.objects.get(id=lot.id).close_time, lot.close_time)
+
+    def test_close_task_of_the_old_close_time_rearms(self):
+        lot = self.create_lot(timedelta(seconds=60))
+        bid = place_bid(lot.id, self.bidder, Decimal(110))
+
+        # The task armed for the old close time runs right after it.
+        with mock.patch("auction_api.tasks.delay_task") as delay_task:
+            with mock.patch(
+                "auction_api.tasks.now",
+                return_value=lot.close_time + timedelta(seconds=1),
+            ):
+                close_auction_lot(lot.id)
+
+        self.assertTrue(AuctionLot.objects.get(id=lot.id).is_active)
+        delay_task.assert_called_once_with(
+            close_auction_lot, lot.id, eta=bid.bid_time + timedelta(seconds=300)
+        )
+
+    def test_bid_event_has_the_extended_close_time(self):
+        lot = self.create_lot(timedelta(seconds=60))
+
+        with mock.patch("auction_api.bidding.publish_lot_event") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                bid = place_bid(lot.id, self.bidder, Decimal(110))
+
+        event = publish.call_args.args[2]
+        self.assertEqual(event["close_time"], bid.bid_time + timedelta(seconds=300))
@@ -1,7 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from auction_api.views import AuctionLotViewSet, BidListCreateView, main_page
+from auction_api.views import (
+    AuctionLotViewSet,
+    BidListCreateView,
+    auction_lot_events,
+)
 
 router = DefaultRouter()
 router.register("auction-lots", AuctionLotViewSet, basename="auction-lots")
@@ -13,6 +17,11 @@ urlpatterns = [
         BidListCreateView.as_view(),
         name="bid-list-create",
     ),
+    path(
+        "auction-lots/<int:pk>/events/",
+        auction_lot_events,
+        name="auction-lot-events",
+    ),
 ]
 
 app_name = "auction_api"
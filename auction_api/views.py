@@ -1,21 +1,105 @@
-from django.db.models import Count
-from django.db.models.functions import Random
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef, Value
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from drf_spectacular.utils import extend_schema, OpenApiParameter, extend_schema_view
-from rest_framework import viewsets, generics, status
+from rest_framework import viewsets, generics, status, serializers
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotAuthenticated,
+)
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from auction_api.models import AuctionLot, Bid, Category
+from auction_api.bidding import BidConflictError, buy_out, place_bid, set_proxy_bid
+from auction_api.bulk_import import import_lots, read_manifest
+from auction_api.events import subscribe_lot_events
+from auction_api.favourites import get_favourite_ids, toggle_favourite
+from auction_api.main_page import get_main_page, get_main_page_etag
+from auction_api.models import AuctionLot, Bid, ProxyBid
+from auction_api.pagination import (
+    AuctionLotCursorPagination,
+    BidCursorPagination,
+    SearchPagination,
+)
+from auction_api.search import search_lots
 from auction_api.serializers import (
     AuctionLotBaseSerializer,
     AuctionLotSerializer,
     BidSerializer,
     AuctionLotDetailSerializer,
-    CategorySerializer,
     AuctionLotListSerializer,
+    AuctionLotSearchQuerySerializer,
+    ProxyBidSerializer,
 )
 
+SSE_KEEPALIVE_SECONDS = 15
+MAIN_PAGE_MAX_AGE = 60
+FAVOURITE_STATUS_MAX_IDS = 100
+
+
+def make_etag(*parts):
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def parse_pk(pk):
+    """Return the lot id from the URL, or None when it isn't one (the view 404s)."""
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def auction_lot_etag(request, pk):
+    pk = parse_pk(pk)
+    if pk is None:
+        return None
+    state = (
+        AuctionLot.objects.filter(pk=pk)
+        .annotate(
+            is_favourited=Exists(
+                AuctionLot.favourites.through.objects.filter(
+                    auctionlot_id=OuterRef("pk"), user_id=request.user.id
+                )
+            )
+        )
+        .values_list(
+            "updated_at",
+            "bid_count",
+            "favourites_count",
+            "is_active",
+            "winner_id",
+            "is_favourited",
+        )
+        .first()
+    )
+    if state is None:
+        return None
+    return make_etag("auction-lot", pk, *state)
+
+
+def bid_list_etag(request, pk):
+    pk = parse_pk(pk)
+    if pk is None:
+        return None
+    state = (
+        AuctionLot.objects.filter(pk=pk).values_list("bid_count", "last_bid_at").first()
+    )
+    if state is None:
+        return None
+    return make_etag("bids", pk, *state, request.get_full_path())
+
 
 @extend_schema_view(
     toggle_favourite=extend_schema(
@@ -41,6 +125,7 @@ class AuctionLotViewSet(viewsets.ModelViewSet):
     queryset = AuctionLot.objects.all()
     serializer_class = AuctionLotSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AuctionLotCursorPagination
 
     @action(detail=True, methods=["post", "get"])
     @extend_schema(
@@ -57,28 +142,115 @@ class AuctionLotViewSet(viewsets.ModelViewSet):
         },
     )
     def toggle_favourite(self, request, pk=None):
-        auction_lot = self.get_object()
-        user = request.user
+        pk = parse_pk(pk)
+        if pk is None or not AuctionLot.objects.filter(pk=pk).exists():
+            raise Http404
 
         if request.method == "GET":
-            is_favourited = user in auction_lot.favourites.all()
             return Response(
-                {"is_favourited": is_favourited},
+                {"is_favourited": pk in get_favourite_ids(request.user.id)},
                 status=status.HTTP_200_OK,
             )
 
-        if user in auction_lot.favourites.all():
-            auction_lot.favourites.remove(user)
-            return Response(
-                {"message": "Auction lot removed from favourites."},
-                status=status.HTTP_200_OK,
-            )
-        else:
-            auction_lot.favourites.add(user)
+        if toggle_favourite(request.user.id, pk):
             return Response(
                 {"message": "Auction lot added to favourites."},
                 status=status.HTTP_201_CREATED,
             )
+        return Response(
+            {"message": "Auction lot removed from favourites."},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["post"])
+    @extend_schema(
+        summary="Buy out an auction lot",
+        description=(
+            "Buys the auction lot at its buyout price and closes it. "
+            "Only the first of concurrent buyouts succeeds."
+        ),
+        request=None,
+        responses={201: BidSerializer},
+    )
+    def buyout(self, request, pk=None):
+        pk = parse_pk(pk)
+        if pk is None:
+            raise Http404
+        try:
+            bid = buy_out(pk, request.user)
+        except ValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        return Response(BidSerializer(bid).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["get", "post"], url_path="proxy-bid")
+    @extend_schema(
+        summary="Get or set the proxy bid on an auction lot",
+        description=(
+            "Registers a hidden maximum price: the user's bids are raised "
+            "automatically by the minimum step, up to that price, whenever "
+            "they are outbid. GET returns the user's current proxy bid."
+        ),
+        request=ProxyBidSerializer,
+        responses={200: ProxyBidSerializer},
+    )
+    def proxy_bid(self, request, pk=None):
+        pk = parse_pk(pk)
+        if pk is None:
+            raise Http404
+
+        if request.method == "GET":
+            # request.user is a TokenUser with JWT_STATELESS_READS.
+            proxy_bid = ProxyBid.objects.filter(
+                auction_lot_id=pk, bidder_id=request.user.id
+            ).first()
+            if proxy_bid is None:
+                raise Http404
+            return Response(ProxyBidSerializer(proxy_bid).data)
+
+        serializer = ProxyBidSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            proxy_bid = set_proxy_bid(
+                pk, request.user, serializer.validated_data["max_price"]
+            )
+        except ValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        return Response(ProxyBidSerializer(proxy_bid).data)
+
+    @action(detail=False, methods=["get"], url_path="favourite-status")
+    @extend_schema(
+        summary="Get favourite status of auction lots",
+        description=(
+            "Returns whether each of the auction lots given as comma-separated "
+            f"`ids` (up to {FAVOURITE_STATUS_MAX_IDS}) is in the user's favourites."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="ids", description="Auction Lot IDs", required=True, type=str
+            )
+        ],
+        responses={200: {"1": True, "2": False}},
+    )
+    def favourite_status(self, request):
+        try:
+            lot_ids = [
+                int(lot_id)
+                for lot_id in request.query_params.get("ids", "").split(",")
+                if lot_id
+            ]
+        except ValueError:
+            return Response(
+                {"ids": "A comma-separated list of integers is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(lot_ids) > FAVOURITE_STATUS_MAX_IDS:
+            return Response(
+                {"ids": f"At most {FAVOURITE_STATUS_MAX_IDS} ids are allowed."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        favourite_ids = get_favourite_ids(request.user.id)
+        return Response({lot_id: lot_id in favourite_ids for lot_id in lot_ids})
 
     @action(detail=False, methods=["get"])
     @action(detail=False, methods=["get"])
@@ -88,17 +260,101 @@ class AuctionLotViewSet(viewsets.ModelViewSet):
         responses={200: AuctionLotSerializer(many=True)},
     )
     def favourites(self, request):
-        user = request.user
-        favourite_lots = AuctionLot.objects.filter(favourites=user)
+        favourite_lots = self.paginate_queryset(self.get_queryset())
         serializer = AuctionLotSerializer(
             favourite_lots, many=True, context={"request": request}
         )
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"], pagination_class=SearchPagination)
+    @extend_schema(
+        summary="Search auction lots",
+        description=(
+            "Full-text search over the item name, description, location and "
+            "category, with price, close time and category filters. "
+            "Returns ranked lots and the number of matches per category."
+        ),
+        parameters=[AuctionLotSearchQuerySerializer],
+    )
+    def search(self, request):
+        query = AuctionLotSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        lots, facets = search_lots(query.validated_data)
+
+        page = self.paginate_queryset(lots)
+        serializer = AuctionLotListSerializer(
+            page, many=True, context={"request": request}
+        )
+        response = self.get_paginated_response(serializer.data)
+        response.data["facets"] = facets
+        return response
+
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=auction_lot_etag))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-import",
+        parser_classes=[MultiPartParser],
+    )
+    @extend_schema(
+        summary="Bulk import auction lots",
+        description=(
+            "Creates auction lots from a CSV or JSON Lines `manifest` file. "
+            "Images referenced by the manifest rows are uploaded as `images` files. "
+            "Invalid rows are skipped and reported with their row number."
+        ),
+    )
+    def bulk_import(self, request):
+        manifest = request.FILES.get("manifest")
+        if manifest is None:
+            return Response(
+                {"manifest": "A CSV or JSON Lines manifest file is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        image_files = {image.name: image for image in request.FILES.getlist("images")}
+        report = import_lots(
+            read_manifest(manifest.file, manifest.name),
+            owner=request.user,
+            image_files=image_files,
+        )
+        return Response(
+            report,
+            status=(
+                status.HTTP_201_CREATED
+                if report["created"]
+                else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+
+        if self.action == "favourites":
+            return queryset.filter(favourites=user.id).annotate(
+                is_favourited=Value(True)
+            )
+        if self.action == "list":
+            return queryset.prefetch_related("images")
+        if self.action == "create":
+            return queryset
+        return queryset.annotate(
+            is_favourited=Exists(
+                AuctionLot.favourites.through.objects.filter(
+                    auctionlot_id=OuterRef("pk"), user_id=user.id
+                )
+            )
+        )
 
     def get_serializer_class(self):
         if self.action == "create":
             return AuctionLotBaseSerializer
-        if self.action == "detail":
+        if self.action == "retrieve":
             return AuctionLotDetailSerializer
         if self.action == "list":
             return AuctionLotListSerializer
@@ -113,37 +369,111 @@ class AuctionLotViewSet(viewsets.ModelViewSet):
         serializer.save(owner=self.request.user)
 
 
+class BidConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The auction lot received a higher bid, please try again."
+    default_code = "bid_conflict"
+
+
 class BidListCreateView(generics.ListCreateAPIView):
     queryset = Bid.objects.all()
     serializer_class = BidSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = BidCursorPagination
+
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=bid_list_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def get_queryset(self):
-        auction_lot = AuctionLot.objects.get(pk=self.kwargs["pk"])
-        return auction_lot.bids.all()
+        return Bid.objects.filter(auction_lot_id=self.kwargs["pk"]).select_related(
+            "bidder"
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["auction_lot_id"] = self.kwargs["pk"]
+        return context
 
     def perform_create(self, serializer):
-        auction_lot = AuctionLot.objects.get(pk=self.kwargs["pk"])
-        serializer.save(bidder=self.request.user, auction_lot=auction_lot)
+        auction_lot = serializer.validated_data["auction_lot"]
+        try:
+            serializer.instance = place_bid(
+                auction_lot.id,
+                bidder=self.request.user,
+                offered_price=serializer.validated_data["offered_price"],
+                expected_bid_count=auction_lot.bid_count,
+            )
+        except BidConflictError as error:
+            raise BidConflict(error.messages)
+        except ValidationError as error:
+            raise serializers.ValidationError(error.messages)
 
 
+@cache_control(public=True, max_age=MAIN_PAGE_MAX_AGE)
+@condition(etag_func=lambda request: get_main_page_etag())
 @api_view(["GET"])
 def main_page(request):
     """
     Main page of the API, returns top-3 categories,
     top-4 lots by bids amount, 4 newest lots and 12 random lots
     """
-    top_categories = Category.objects.all()[:4]
-    all_lots = AuctionLot.objects.all()
-    top_lots = all_lots.annotate(bids_sum=Count("bids")).order_by("-bids_sum")[:3]
-    new = all_lots.order_by("-created_at")[:4]
-    also_like = all_lots.order_by(Random())[:12]
-
-    response_data = {
-        "categories": CategorySerializer(top_categories, many=True).data,
-        "top_lots": AuctionLotListSerializer(top_lots, many=True).data,
-        "new": AuctionLotListSerializer(new, many=True).data,
-        "also_like": AuctionLotListSerializer(also_like, many=True).data,
-    }
-
-    return Response(response_data)
+    return Response(get_main_page())
+
+
+async def auction_lot_events(request, pk):
+    """
+    Server-Sent Events stream of an auction lot: the current state on connect,
+    then every new bid and the closing of the lot. Requires an ASGI server.
+    Authenticated like the rest of the auction lot endpoints.
+    """
+    if not await sync_to_async(authenticate_request)(request):
+        return JsonResponse(
+            {"detail": NotAuthenticated.default_detail},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+    if not await AuctionLot.objects.filter(pk=pk).aexists():
+        raise Http404("AuctionLot was not found.")
+
+    async def event_stream():
+        events = subscribe_lot_events(pk, timeout=SSE_KEEPALIVE_SECONDS)
+        # Subscribe before reading the state, so no bid falls in between.
+        await anext(events)
+        lot = await (
+            AuctionLot.objects.filter(pk=pk)
+            .values("current_price", "bid_count", "is_active", "winner_id")
+            .afirst()
+        )
+        if lot is None:
+            await events.aclose()
+            return
+
+        yield format_sse("state", json.dumps(lot, cls=DjangoJSONEncoder))
+        async for message in events:
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            event = json.loads(message)
+            yield format_sse(event["event"], json.dumps(event["data"]))
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def authenticate_request(request):
+    """Authenticate a plain Django request with the API's authentication classes."""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        if result is not None:
+            return result[0]
+    return None
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {data}\n\n"
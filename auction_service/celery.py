@@ -1,8 +1,15 @@
+import logging
 import os
+import time
+
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
+
+from auction_service.metrics import record_task_duration
 
+logger = logging.getLogger(__name__)
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auction_project.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auction_service.settings")
 
 app = Celery("auction_service")
 
@@ -10,7 +17,21 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
 
+task_started_at = {}
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **kwargs):
+    task_started_at[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def stop_task_timer(task_id=None, task=None, state=None, **kwargs):
+    started = task_started_at.pop(task_id, None)
+    if started is not None:
+        record_task_duration(task.name, state, time.perf_counter() - started)
+
 
 @app.task(bind=True)
 def debug_task(self):
-    print(f"Request: {self.request!r}")
+    logger.info("Request: %r", self.request)
@@ -0,0 +1,119 @@
+"""
+Routing of reads to the database replicas listed in DATABASE_REPLICAS.
+
+Reads only go to a replica during safe (GET/HEAD/OPTIONS) requests, and
+only outside transactions. Writing requests, management commands and
+Celery tasks keep using the primary. A client that has just written is
+pinned to the primary for REPLICA_PIN_SECONDS, so it sees its own writes
+(e.g. a bid it has just placed) even if the replicas lag behind.
+"""
+
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_KEY_PREFIX = "db:pin_primary"
+
+replicas_allowed = ContextVar("replicas_allowed", default=False)
+
+
+@contextmanager
+def use_primary():
+    """Send all reads of the block to the primary database."""
+    token = replicas_allowed.set(False)
+    try:
+        yield
+    finally:
+        replicas_allowed.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or not replicas_allowed.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _get_pin_key(request):
+    # Clients are told apart by their credentials, which are known before
+    # the (JWT) authentication of the view has queried the user.
+    credentials = request.headers.get("Authorization") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credentials:
+        return None
+    digest = hashlib.sha256(credentials.encode()).hexdigest()
+    return f"{PIN_KEY_PREFIX}:{digest}"
+
+
+class ReplicaRoutingMiddleware:
+    """Allow replica reads for safe requests of clients that aren't pinned."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        pin_key = _get_pin_key(request)
+        pinned = pin_key is not None and cache.get(pin_key)
+        token = replicas_allowed.set(request.method in SAFE_METHODS and not pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas_allowed.reset(token)
+        if self.should_pin(request, response, pin_key):
+            cache.set(pin_key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        pin_key = _get_pin_key(request)
+        pinned = pin_key is not None and await cache.aget(pin_key)
+        token = replicas_allowed.set(request.method in SAFE_METHODS and not pinned)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas_allowed.reset(token)
+        if self.should_pin(request, response, pin_key):
+            await cache.aset(pin_key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    @staticmethod
+    def should_pin(request, response, pin_key):
+        return (
+            pin_key is not None
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        )
@@ -0,0 +1,107 @@
+import copy
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from auction_service.metrics import Counter
+
+DEFAULT_QUEUE_SIZE = 10000
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "taskName"}
+
+DROPPED_RECORDS = Counter(
+    "log_records_dropped_total", "Log records dropped because the queue was full."
+)
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including their `extra` fields."""
+
+    def format(self, record):
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in RECORD_ATTRIBUTES and not key.startswith("_")
+        )
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through only a `rate` share of the records at or below `level`,
+    for loggers that emit an event per bid or per lot.
+    """
+
+    def __init__(self, rate=1.0, level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.level = level
+
+    def filter(self, record):
+        return record.levelno > self.level or random.random() < self.rate
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Put records on a bounded queue written to `stream` by a background thread,
+    so request threads never block on output. Records are dropped
+    when the queue is full.
+
+    Forked processes (gunicorn and Celery workers) don't inherit the thread,
+    so it is started on the first record emitted in each process.
+    """
+
+    def __init__(self, stream=None, queue_size=DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.listener = None
+        self.listener_pid = None
+
+    def start_listener(self):
+        # Called under the handler lock, which logging re-creates after a fork.
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self.listener_pid = os.getpid()
+
+    def setFormatter(self, fmt):
+        # Records are formatted by the writing thread.
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.listener_pid != os.getpid():
+            self.start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED_RECORDS.inc()
+
+    def close(self):
+        if self.listener is not None and self.listener_pid == os.getpid():
+            self.listener.stop()
+        self.listener = None
+        self.listener_pid = None
+        self.target.close()
+        super().close()
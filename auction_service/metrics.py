@@ -0,0 +1,339 @@
+"""
+In-process request metrics exposed in the Prometheus text format.
+
+Request metrics are kept per process, so every web worker reports its own
+numbers. Celery runs in separate processes, so task metrics are kept in
+the shared cache instead.
+"""
+
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+TASK_METRICS_PREFIX = "metrics:task"
+SLOW_REQUEST_MAX_QUERIES = 10
+
+current_request = ContextVar("current_request", default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            lines.extend(self._render_value(labels, value))
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, labels, value):
+        yield f"{self.name}{_format_labels(labels)} {value}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def _render_value(self, labels, counts):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            bucket_labels = (*labels, ("le", bound))
+            yield f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(labels)} {counts[-1]}"
+        yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+REGISTRY = []
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by view and status.")
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time spent handling requests."
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries made per request.",
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_QUERY_DURATION = Histogram(
+    "http_request_db_duration_seconds", "Time spent in database queries per request."
+)
+RENDER_DURATION = Histogram(
+    "http_response_render_duration_seconds",
+    "Time spent rendering API responses.",
+)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result.")
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = []
+        self.render_duration = 0
+
+    @property
+    def query_duration(self):
+        return sum(duration for _, duration in self.queries)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection, recording the query in the
+    stats of the current request. The stats are found through a context
+    variable, which asgiref copies into the threads running sync code,
+    so the queries of sync views served over ASGI are recorded too.
+    """
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries.append((sql, time.perf_counter() - started))
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def record_render(duration):
+    stats = current_request.get()
+    if stats is not None:
+        stats.render_duration += duration
+
+
+def record_cache_lookup(name, hit):
+    CACHE_REQUESTS.inc(cache=name, result="hit" if hit else "miss")
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, database queries and rendering time of every request,
+    and log the slowest queries of requests above the SLOW_REQUEST_* limits.
+    The queries of streamed responses (e.g. event streams) run after
+    the request is recorded and aren't counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # Connections opened before this module was imported (e.g. by
+        # management commands or the test runner) missed connection_created.
+        for alias in settings.DATABASES:
+            install_query_recorder(connections[alias])
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def record(self, request, response, duration, stats):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_DURATION.observe(duration, view=view)
+        REQUEST_QUERIES.observe(len(stats.queries), view=view)
+        REQUEST_QUERY_DURATION.observe(stats.query_duration, view=view)
+        if stats.render_duration:
+            RENDER_DURATION.observe(stats.render_duration, view=view)
+
+        if (
+            duration >= settings.SLOW_REQUEST_SECONDS
+            or len(stats.queries) >= settings.SLOW_REQUEST_QUERIES
+        ):
+            self.log_slow_request(request, response, view, duration, stats)
+
+    @staticmethod
+    def log_slow_request(request, response, view, duration, stats):
+        slowest = sorted(stats.queries, key=lambda query: query[1], reverse=True)
+        logger.warning(
+            "Slow request %s %s: %.3fs, %d queries",
+            request.method,
+            request.path,
+            duration,
+            len(stats.queries),
+            extra={
+                "view": view,
+                "status": response.status_code,
+                "duration": round(duration, 4),
+                "db_duration": round(stats.query_duration, 4),
+                "render_duration": round(stats.render_duration, 4),
+                "query_count": len(stats.queries),
+                "queries": [
+                    {"sql": sql, "duration": round(query_duration, 4)}
+                    for sql, query_duration in slowest[:SLOW_REQUEST_MAX_QUERIES]
+                ],
+            },
+        )
+
+
+def _task_key(task_name, field):
+    return f"{TASK_METRICS_PREFIX}:{task_name}:{field}"
+
+
+def _cache_incr(key, amount):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Evicted between add() and incr().
+        cache.set(key, amount, timeout=None)
+
+
+def record_task_duration(task_name, state, duration):
+    bucket = bisect_left(DEFAULT_BUCKETS, duration)
+    try:
+        _cache_incr(_task_key(task_name, f"bucket:{bucket}"), 1)
+        _cache_incr(_task_key(task_name, f"state:{state}"), 1)
+        # incr() only takes integers, so the sum is kept in microseconds.
+        _cache_incr(_task_key(task_name, "sum_us"), int(duration * 1_000_000))
+    except Exception:
+        logger.exception("Could not record the duration of task %s", task_name)
+
+
+def render_task_metrics(task_names, states=("SUCCESS", "FAILURE", "RETRY")):
+    lines = [
+        "# HELP celery_task_duration_seconds Time spent running Celery tasks.",
+        "# TYPE celery_task_duration_seconds histogram",
+    ]
+    state_lines = [
+        "# HELP celery_tasks_total Finished Celery tasks by state.",
+        "# TYPE celery_tasks_total counter",
+    ]
+    for task_name in sorted(task_names):
+        keys = [
+            _task_key(task_name, f"bucket:{bucket}")
+            for bucket in range(len(DEFAULT_BUCKETS) + 1)
+        ]
+        state_keys = [_task_key(task_name, f"state:{state}") for state in states]
+        sum_key = _task_key(task_name, "sum_us")
+        values = cache.get_many([*keys, *state_keys, sum_key])
+        if not values:
+            continue
+
+        labels = (("task", task_name),)
+        cumulative = 0
+        for bound, key in zip((*DEFAULT_BUCKETS, "+Inf"), keys):
+            cumulative += values.get(key, 0)
+            lines.append(
+                "celery_task_duration_seconds_bucket"
+                f"{_format_labels((*labels, ('le', bound)))} {cumulative}"
+            )
+        lines.append(
+            f"celery_task_duration_seconds_sum{_format_labels(labels)} "
+            f"{values.get(sum_key, 0) / 1_000_000}"
+        )
+        lines.append(
+            f"celery_task_duration_seconds_count{_format_labels(labels)} {cumulative}"
+        )
+        for state, key in zip(states, state_keys):
+            state_labels = (*labels, ("state", state))
+            state_lines.append(
+                f"celery_tasks_total{_format_labels(state_labels)} "
+                f"{values.get(key, 0)}"
+            )
+    return lines + state_lines
+
+
+def metrics_view(request):
+    # Without a configured token the metrics aren't exposed at all.
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if not token or not hmac.compare_digest(authorization, f"Bearer {token}"):
+        return HttpResponseForbidden()
+
+    from auction_service.celery import app
+
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(
+        render_task_metrics(
+            name for name in app.tasks if not name.startswith("celery.")
+        )
+    )
+    return HttpResponse(
+        "\n".join(lines) + "\n", content_type="text/plain; version=0.0.4"
+    )
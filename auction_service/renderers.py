@@ -0,0 +1,16 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from auction_service.metrics import record_render
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSON renderer that reports its rendering time to the request metrics."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            record_render(time.perf_counter() - started)
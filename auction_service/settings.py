@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "django_rest_passwordreset",
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "auction_service.metrics.MetricsMiddleware",
+    "auction_service.db_router.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -89,6 +92,26 @@ WSGI_APPLICATION = "auction_service.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# The app is served over ASGI, where every request runs its queries in a new
+# thread, so persistent connections (DB_CONN_MAX_AGE) are never reused and
+# pile up. Connections come from a psycopg pool instead, set DB_POOL=False to
+# open one per request, e.g. when every connection goes through PgBouncer.
+# DB_CONN_MAX_AGE only pays off with WSGI workers. Set DB_PGBOUNCER when
+# connecting through PgBouncer in transaction mode.
+DB_POOL = os.getenv("DB_POOL", "True").lower() in ("true", "1", "yes")
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "False").lower() in ("true", "1", "yes")
+
+DB_OPTIONS = {}
+if DB_POOL:
+    DB_OPTIONS["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+        "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+    }
+if DB_PGBOUNCER:
+    # Prepared statements don't survive PgBouncer switching server connections.
+    DB_OPTIONS["prepare_threshold"] = None
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -97,9 +120,51 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         "HOST": os.getenv("DB_HOST", "db"),
         "PORT": os.getenv("DB_PORT", 5432),
+        # Pooled connections are returned to the pool after every request.
+        "CONN_MAX_AGE": 0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": True,
+        "DISABLE_SERVER_SIDE_CURSORS": DB_PGBOUNCER,
+        "OPTIONS": DB_OPTIONS,
     }
 }
 
+# Comma-separated "host[:port]" list of read replicas of the default database.
+DB_REPLICA_HOSTS = [
+    host for host in os.getenv("DB_REPLICA_HOSTS", "").split(",") if host.strip()
+]
+DATABASE_REPLICAS = []
+for number, replica in enumerate(DB_REPLICA_HOSTS, start=1):
+    host, _, port = replica.strip().partition(":")
+    alias = f"replica_{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["auction_service.db_router.PrimaryReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after a write.
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -145,11 +210,28 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "user.User"
 
+# Authenticate read-only requests from the token claims alone, without
+# looking the user up. Deactivation then takes effect when the token expires.
+JWT_STATELESS_READS = os.getenv("JWT_STATELESS_READS", "False").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", 60))
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        (
+            "user.authentication.StatelessReadJWTAuthentication"
+            if JWT_STATELESS_READS
+            else "user.authentication.CachedJWTAuthentication"
+        ),
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": (
+        "auction_service.renderers.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -171,7 +253,9 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(days=30),
     "SLIDING_TOKEN_REFRESH_LIFETIME_LATE_USER": timedelta(days=1),
     "SLIDING_TOKEN_LIFETIME_LATE_USER": timedelta(days=30),
-    "UPDATE_LAST_LOGIN": True,
+    # Saves the user row on every token issue, so it is opt-in.
+    "UPDATE_LAST_LOGIN": os.getenv("JWT_UPDATE_LAST_LOGIN", "False").lower()
+    in ("true", "1", "yes"),
 }
 
 MEDIA_URL = "files/media/"
@@ -179,6 +263,54 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "noreply@somehost.local")
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+
 CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
+# Keep the LOGGING configuration in the workers.
+CELERY_WORKER_HIJACK_ROOT_LOGGER = False
+
+# Requests slower or making more queries than this are logged with their SQL.
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 0.5))
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", 50))
+# /metrics requires an "Authorization: Bearer <token>" header, and is
+# disabled while no token is set.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Share of the per-bid and per-lot debug records that are logged.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.01))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "auction_service.logging.JSONFormatter"},
+    },
+    "filters": {
+        "sampled": {
+            "()": "auction_service.logging.SamplingFilter",
+            "rate": LOG_SAMPLE_RATE,
+        },
+    },
+    "handlers": {
+        "console": {
+            "class": "auction_service.logging.QueueListenerHandler",
+            "stream": "ext://sys.stdout",
+            "formatter": "json",
+        },
+    },
+    "root": {"handlers": ["console"], "level": "WARNING"},
+    "loggers": {
+        "django": {"handlers": [], "level": "INFO"},
+        "celery": {"level": "INFO"},
+        "auction_api": {"level": LOG_LEVEL},
+        "auction_api.serializers": {"filters": ["sampled"]},
+        "auction_api.tasks": {"filters": ["sampled"]},
+        "auction_service": {"level": LOG_LEVEL},
+        "user": {"level": LOG_LEVEL},
+    },
+}
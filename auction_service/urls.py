@@ -26,10 +26,12 @@ from drf_spectacular.views import (
 )
 
 from auction_api.views import main_page
+from auction_service.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", main_page, name="main_page"),
+    path("metrics/", metrics_view, name="metrics"),
     path("account/", include("user.urls", namespace="user")),
     path("api/", include("auction_api.urls", namespace="auction-api")),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
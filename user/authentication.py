@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+def get_user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(get_user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that keeps the users it resolves in the cache for
+    AUTH_USER_CACHE_TIMEOUT seconds. Cached users are dropped whenever
+    the user row is saved (profile update, password change, deactivation).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        cache_key = get_user_cache_key(user_id)
+        user = cache.get(cache_key)
+        if user is None:
+            # Raises for unknown and inactive users, so those are never cached.
+            user = super().get_user(validated_token)
+            cache.set(cache_key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+
+class StatelessReadJWTAuthentication(CachedJWTAuthentication):
+    """
+    Trust the token claims for read-only requests and authenticate them with
+    a TokenUser, without loading the user at all. A deactivated user keeps
+    read access until their access token expires.
+    """
+
+    def authenticate(self, request):
+        self.request_method = request.method
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if self.request_method in SAFE_METHODS:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        return super().get_user(validated_token)
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="telegram_chat_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
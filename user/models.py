@@ -55,6 +55,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     )
     date_joined = models.DateTimeField(auto_now_add=True)
     balance = models.DecimalField(decimal_places=2, max_digits=10, default=0)
+    telegram_chat_id = models.BigIntegerField(null=True, blank=True)
 
     objects = CustomUserManager()
 
@@ -72,6 +72,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
             "last_name",
             "profile_pic",
             "balance",
+            "telegram_chat_id",
             "password",
         )
 
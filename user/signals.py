@@ -1,10 +1,19 @@
-from django.core.mail import EmailMultiAlternatives
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.template.loader import render_to_string
 from django.urls import reverse
 
 from django_rest_passwordreset.signals import reset_password_token_created
 
+from auction_api.tasks import delay_task
+from user.authentication import invalidate_cached_user
+from user.tasks import send_password_reset_email
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(
@@ -20,34 +29,13 @@ def password_reset_token_created(
     :param kwargs:
     :return:
     """
-    # send an e-mail to the user
-    context = {
-        "current_user": reset_password_token.user,
-        # "username": reset_password_token.user.username,
-        "email": reset_password_token.user.email,
-        "reset_password_url": "{}?token={}".format(
-            instance.request.build_absolute_uri(
-                reverse("user:password_reset:reset-password-confirm")
-            ),
-            reset_password_token.key,
-        ),  ## password_reset:reset-password-confirm
-    }
-
-    # render email text
-    email_html_message = render_to_string("emails/user_reset_password.html", context)
-    email_plaintext_message = render_to_string(
-        "emails/user_reset_password.txt", context
+    # The e-mail is sent by a worker, so the request doesn't wait for SMTP.
+    reset_password_url = "{}?token={}".format(
+        instance.request.build_absolute_uri(
+            reverse("user:password_reset:reset-password-confirm")
+        ),
+        reset_password_token.key,
     )
-
-    msg = EmailMultiAlternatives(
-        # title:
-        "Password Reset for {title}".format(title="topbid.ua service"),
-        # message:
-        email_plaintext_message,
-        # from:
-        "noreply@somehost.local",
-        # to:
-        [reset_password_token.user.email],
+    delay_task(
+        send_password_reset_email, reset_password_token.user_id, reset_password_url
     )
-    msg.attach_alternative(email_html_message, "text/html")
-    msg.send()
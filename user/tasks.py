@@ -0,0 +1,26 @@
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+
+
+@shared_task
+def send_password_reset_email(user_id, reset_password_url):
+    user = get_user_model().objects.get(id=user_id)
+    context = {
+        "current_user": user,
+        "email": user.email,
+        "reset_password_url": reset_password_url,
+    }
+
+    msg = EmailMultiAlternatives(
+        "Password Reset for {title}".format(title="topbid.ua service"),
+        render_to_string("emails/user_reset_password.txt", context),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+    msg.attach_alternative(
+        render_to_string("emails/user_reset_password.html", context), "text/html"
+    )
+    msg.send()
@@ -1,3 +1,34 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+
+def run_task(task, *args, **options):
+    return task(*args)
+
+
+class PasswordResetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com", password="password123"
+        )
+        self.client = APIClient()
+
+    def test_reset_email_is_sent_by_a_task(self):
+        with mock.patch("user.signals.delay_task", side_effect=run_task) as delay_task:
+            response = self.client.post(
+                reverse("user:password_reset:reset-password-request"),
+                {"email": self.user.email},
+            )
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 200, response.content)
+        delay_task.assert_called_once()
+        self.assertEqual(len(mail.outbox), 1)
+        message = mail.outbox[0]
+        self.assertEqual(message.to, [self.user.email])
+        self.assertIn("?token=", message.body)
+        self.assertEqual(message.alternatives[0][1], "text/html")